@@ -0,0 +1,277 @@
+"""Per-client rate limits and load shedding for the API.
+
+Two guards stand between a request and MongoDB:
+
+- Token buckets (RateLimiter). Every API route has a bucket per client
+  address and, for routes under /cart/{session_id}, one per session. A
+  request takes a token from each; when one is empty the request is
+  answered 429 with Retry-After set to when the next token arrives. The
+  session bucket catches one noisy cart; the address bucket catches a bot
+  that invents a new session id for every request, and is sized for many
+  shoppers behind one NAT.
+- A concurrency gate per worker (AdmissionMiddleware). At most
+  `max_concurrency` API requests run at once and at most `max_queue` more
+  wait up to `queue_timeout` for a slot; everything beyond that is
+  answered 503 straight away. Set below the MongoDB pool size, this makes
+  overload queue here, where refusing is cheap, instead of in the driver's
+  wait queue, where every request already holds its memory and a timeout.
+
+Buckets live in process memory, so each worker enforces the limits on its
+own, or in Redis, shared by all workers. The Redis buckets fail open: if
+Redis is unreachable, requests are admitted rather than refused.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request
+
+from metrics import REQUESTS_SHED
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # pragma: no cover - redis is optional
+    aioredis = None
+    RedisError = Exception
+
+
+class Rate(NamedTuple):
+    per_second: float
+    burst: int
+
+
+Bucket = Tuple[str, Rate]
+
+
+def _refill(tokens: float, stamp: float, rate: Rate, now: float) -> float:
+    return min(rate.burst, tokens + max(0.0, now - stamp) * rate.per_second)
+
+
+class MemoryBuckets:
+    """Token buckets in this process; the least recently used are forgotten
+    beyond `max_keys`, which only ever hands a client a full bucket."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, buckets: Sequence[Bucket], now: Optional[float] = None) -> float:
+        """Take a token from every bucket, or from none of them.
+
+        Returns 0 when the tokens were taken, otherwise the seconds until
+        every bucket has one again.
+        """
+        now = time.monotonic() if now is None else now
+        levels = []
+        for key, rate in buckets:
+            tokens, stamp = self._buckets.get(key, (rate.burst, now))
+            levels.append(_refill(tokens, stamp, rate, now))
+        wait = max((
+            (1 - tokens) / rate.per_second
+            for tokens, (_, rate) in zip(levels, buckets) if tokens < 1
+        ), default=0.0)
+        for tokens, (key, _) in zip(levels, buckets):
+            self._buckets[key] = (tokens if wait else tokens - 1, now)
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def close(self) -> None:
+        pass
+
+
+# KEYS: the buckets; ARGV: now, then per_second and burst for each key.
+# Same rules as MemoryBuckets.take; the wait is returned as a string since
+# Redis truncates Lua numbers to integers.
+_TAKE = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local per_second = tonumber(ARGV[i * 2])
+    local burst = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call("hmget", key, "tokens", "stamp")
+    local tokens = tonumber(state[1]) or burst
+    local stamp = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - stamp) * per_second)
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / per_second)
+    end
+    levels[i] = tokens
+end
+for i, key in ipairs(KEYS) do
+    local tokens = levels[i]
+    if wait == 0 then
+        tokens = tokens - 1
+    end
+    redis.call("hset", key, "tokens", tostring(tokens), "stamp", ARGV[1])
+    -- Gone once it would have refilled anyway
+    local full_after = tonumber(ARGV[i * 2 + 1]) / tonumber(ARGV[i * 2])
+    redis.call("pexpire", key, math.ceil(full_after * 1000) + 1000)
+end
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """Token buckets in Redis, shared by every worker; one script call per
+    request."""
+
+    def __init__(self, client, prefix: str = "abcd:rate:"):
+        self.client = client
+        self.prefix = prefix
+        self.errors = 0
+
+    async def take(self, buckets: Sequence[Bucket], now: Optional[float] = None) -> float:
+        # Wall clock, the one thing the workers' clocks agree on
+        now = time.time() if now is None else now
+        args: List = [repr(now)]
+        for _, rate in buckets:
+            args += [repr(float(rate.per_second)), rate.burst]
+        try:
+            wait = await self.client.eval(_TAKE, len(buckets), *(self.prefix + key for key, _ in buckets), *args)
+        except RedisError as e:
+            self.errors += 1
+            logger.warning("Redis rate limit check failed, admitting the request: %s", e)
+            return 0.0
+        return float(wait)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_buckets(url: Optional[str]):
+    """Redis buckets for a URL (`memory://` for fakeredis), otherwise
+    buckets in this process."""
+    if not url:
+        return MemoryBuckets()
+    if url.startswith("memory://"):
+        try:
+            from fakeredis import aioredis as fake_aioredis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL=memory:// requires the fakeredis package")
+        return RedisBuckets(fake_aioredis.FakeRedis())
+    if aioredis is None:
+        raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the redis package is not installed")
+    return RedisBuckets(aioredis.from_url(url))
+
+
+def client_address(request: Request, trusted_proxies: int = 0) -> str:
+    """The address the request came from.
+
+    Behind `trusted_proxies` proxies that each append their peer to
+    X-Forwarded-For, the client is that many entries from the right; the
+    entries further left are whatever the client chose to send, which is
+    why the count must never exceed the proxies actually deployed. A
+    shorter header means fewer proxies were passed, so its first entry is
+    the client.
+    """
+    if trusted_proxies:
+        forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if forwarded:
+            return forwarded[-min(trusted_proxies, len(forwarded))]
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimiter:
+    """FastAPI dependency enforcing the token buckets of the matched route."""
+
+    def __init__(
+        self,
+        buckets,
+        session_rate: Rate,
+        client_rate: Rate,
+        trusted_proxies: int = 0,
+        enabled: bool = True,
+        exempt: Sequence[str] = (),
+    ):
+        self.buckets = buckets
+        self.session_rate = session_rate
+        self.client_rate = client_rate
+        self.trusted_proxies = trusted_proxies
+        self.enabled = enabled
+        # Route templates never limited, e.g. health checks
+        self.exempt = set(exempt)
+
+    async def __call__(self, request: Request) -> None:
+        if not self.enabled:
+            return
+        # Keyed by the route template, so every product shares one bucket
+        template = getattr(request.scope.get("route"), "path_format", request.url.path)
+        if template in self.exempt:
+            return
+        route = f"{request.method} {template}"
+        buckets = [(f"client:{client_address(request, self.trusted_proxies)}:{route}", self.client_rate)]
+        session_id = request.path_params.get("session_id")
+        if session_id:
+            buckets.append((f"session:{session_id}:{route}", self.session_rate))
+        wait = await self.buckets.take(buckets)
+        if wait:
+            REQUESTS_SHED.labels("rate_limited").inc()
+            raise HTTPException(
+                status_code=429, detail="Too many requests, slow down",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+
+
+class AdmissionMiddleware:
+    """ASGI middleware bounding the API requests a worker serves at once."""
+
+    def __init__(
+        self,
+        app,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        prefix: str = "/api/",
+        exempt: Sequence[str] = (),
+    ):
+        self.app = app
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.prefix = prefix
+        # Path prefixes always admitted, so probes still answer under load
+        self.exempt = tuple(exempt)
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(self.prefix) or path.startswith(self.exempt):
+            await self.app(scope, receive, send)
+            return
+
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                await self._shed(send, "queue_full")
+                return
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                await self._shed(send, "queue_timeout")
+                return
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._slots.release()
+
+    async def _shed(self, send, reason: str) -> None:
+        REQUESTS_SHED.labels(reason).inc()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [(b"content-type", b"application/json"), (b"retry-after", b"1")],
+        })
+        await send({"type": "http.response.body", "body": b'{"detail":"Server busy, try again"}'})
@@ -0,0 +1,267 @@
+"""Bulk product import from CSV, JSON or NDJSON.
+
+Rows are validated against ProductCreate one by one, so a bad row is
+reported and skipped instead of failing the import. Valid rows are written
+in unordered bulk_write batches: rows with an `id` are upserted by it, rows
+without one are inserted as new products. An upsert only overwrites the
+fields its row gives; defaults apply to products it creates. A row's
+`stock` is what is on hand, so units held in carts (see inventory.py) are
+subtracted before it becomes the available stock. Input is consumed as a
+stream of lines, so CSV and NDJSON feeds are never held in memory whole.
+Input that cannot be read on (bad UTF-8, malformed JSON) ends the import
+there: the rows before it are written and reported, with the error.
+"""
+import asyncio
+import csv
+import json
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+from pydantic import ValidationError
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from inventory import available, held
+
+FORMATS = ("csv", "json", "ndjson")
+
+# CSV cells holding lists separate their values with this
+CSV_LIST_SEPARATOR = ";"
+_CSV_LIST_FIELDS = ("colors", "images")
+
+
+def format_for_content_type(content_type: Optional[str]) -> Optional[str]:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return {
+        "text/csv": "csv",
+        "application/json": "json",
+        "application/x-ndjson": "ndjson",
+        "application/ndjson": "ndjson",
+    }.get(media_type)
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into decoded lines."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8-sig").rstrip("\r")
+
+
+async def _csv_records(lines: AsyncIterator[str]) -> AsyncIterator[Any]:
+    header = None
+    buffered = ""
+    async for line in lines:
+        # A quoted cell may span lines; wait until the quotes balance
+        buffered = f"{buffered}\n{line}" if buffered else line
+        if buffered.count('"') % 2:
+            continue
+        row, buffered = buffered, ""
+        if not row.strip():
+            continue
+        values = next(csv.reader([row]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        record: Dict[str, Any] = {}
+        for name, value in zip(header, values):
+            if value == "":
+                continue
+            if name in _CSV_LIST_FIELDS:
+                value = [v.strip() for v in value.split(CSV_LIST_SEPARATOR) if v.strip()]
+            record[name] = value
+        yield record
+    if buffered:
+        yield ValueError("unterminated quoted field")
+
+
+async def _ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[Any]:
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield e
+
+
+async def _json_records(lines: AsyncIterator[str]) -> AsyncIterator[Any]:
+    records = json.loads("\n".join([line async for line in lines]))
+    if not isinstance(records, list):
+        raise ValueError("JSON input must be an array of products")
+    for record in records:
+        yield record
+
+
+async def read_records(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[Any]:
+    """Yield one parsed record per input row, or the exception that row raised."""
+    readers = {"csv": _csv_records, "json": _json_records, "ndjson": _ndjson_records}
+    if fmt not in readers:
+        raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(FORMATS)}")
+    async for record in readers[fmt](lines):
+        yield record
+
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in e['loc']) or 'row'}: {e['msg']}" for e in error.errors()
+        )
+    return str(error)
+
+
+class Upsert(NamedTuple):
+    """A row for an existing or new id; made into an UpdateOne once the
+    batch knows how much of each product is reserved."""
+    product_id: str
+    fields: Dict[str, Any]
+    defaults: Dict[str, Any]
+    now: datetime
+
+    def operation(self, reserved: int = 0) -> UpdateOne:
+        fields = dict(self.fields)
+        if "stock" in fields:
+            fields["stock"] = available(fields["stock"], reserved)
+        return UpdateOne(
+            {"id": self.product_id},
+            {
+                "$set": {**fields, "updated_at": self.now},
+                "$setOnInsert": {**self.defaults, "created_at": self.now},
+            },
+            upsert=True,
+        )
+
+
+def build_operation(record: Any, create_model, product_model, now: datetime, enrich=None):
+    """Validate one record and turn it into an InsertOne or an Upsert, or raise.
+
+    enrich, when given, returns derived fields to store with the product.
+    """
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("row must be an object")
+    product_id = record.get("id")
+    validated = create_model.model_validate(record)
+    fields = validated.model_dump()
+    derived = enrich(fields) if enrich else {}
+    if product_id is None:
+        product = product_model(**fields, created_at=now, updated_at=now)
+        return product.id, "inserted", InsertOne({**product.model_dump(), **derived})
+    if not isinstance(product_id, str) or not product_id:
+        raise ValueError("id must be a non-empty string")
+    given = validated.model_dump(exclude_unset=True)
+    # Fields the row left out keep their stored values
+    defaults = {field: value for field, value in fields.items() if field not in given}
+    return product_id, None, Upsert(product_id, {**given, **derived}, defaults, now)
+
+
+class ImportReport:
+    def __init__(self):
+        self.results: List[Dict[str, Any]] = []
+        self.counts = {"inserted": 0, "updated": 0, "failed": 0}
+        # Why the input stopped being read, if it did
+        self.error: Optional[str] = None
+
+    def add(self, row: int, status: str, product_id: Optional[str] = None, error: Optional[str] = None):
+        result = {"row": row, "status": status}
+        if product_id is not None:
+            result["id"] = product_id
+        if error is not None:
+            result["error"] = error
+        self.results.append(result)
+        self.counts[status] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        results = sorted(self.results, key=lambda r: r["row"])
+        report = {**self.counts, "total": len(results), "results": results}
+        if self.error is not None:
+            report["error"] = self.error
+        return report
+
+
+async def _write_batch(collection, batch: List[Tuple[int, str, Optional[str], Any]], report: ImportReport,
+                       reservations=None):
+    restocked = [operation.product_id for _, _, _, operation in batch
+                 if isinstance(operation, Upsert) and "stock" in operation.fields]
+    reserved = await held(reservations, restocked) if reservations is not None else {}
+    operations = [
+        operation.operation(reserved.get(operation.product_id, 0)) if isinstance(operation, Upsert) else operation
+        for _, _, _, operation in batch
+    ]
+    errors: Dict[int, str] = {}
+    try:
+        result = await collection.bulk_write(operations, ordered=False)
+        upserted = set(result.upserted_ids)
+    except BulkWriteError as e:
+        # Unordered: every operation not listed in writeErrors was applied
+        errors = {error["index"]: error.get("errmsg", "write failed") for error in e.details["writeErrors"]}
+        upserted = {item["index"] for item in e.details.get("upserted", [])}
+    for index, (row, product_id, status, _) in enumerate(batch):
+        if index in errors:
+            report.add(row, "failed", product_id, errors[index])
+        else:
+            report.add(row, status or ("inserted" if index in upserted else "updated"), product_id)
+
+
+async def import_products(
+    collection,
+    records: AsyncIterator[Any],
+    create_model,
+    product_model,
+    batch_size: int = 500,
+    concurrency: int = 1,
+    enrich=None,
+    reservations=None,
+) -> Dict[str, Any]:
+    """Validate and write every record, returning per-row results and,
+    if the records stopped with a ValueError, its message as `error`.
+
+    Up to `concurrency` batches are written at once. Keep it at 1 when the
+    same id may appear more than once in a feed, so the last row wins.
+    With `reservations` given, stock held in carts is subtracted from each
+    row's stock.
+    """
+    report = ImportReport()
+    in_flight = set()
+    batch = []
+    row = 0
+
+    async def flush(batch):
+        if len(in_flight) >= concurrency:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            in_flight.difference_update(done)
+            for task in done:
+                task.result()
+        in_flight.add(asyncio.ensure_future(_write_batch(collection, batch, report, reservations)))
+
+    rows = records.__aiter__()
+    while True:
+        try:
+            record = await rows.__anext__()
+        except StopAsyncIteration:
+            break
+        except ValueError as e:
+            report.error = str(e)
+            break
+        row += 1
+        try:
+            product_id, status, operation = build_operation(
+                record, create_model, product_model, datetime.utcnow(), enrich
+            )
+        except (ValueError, ValidationError) as e:
+            report.add(row, "failed", error=_error_message(e))
+            continue
+        batch.append((row, product_id, status, operation))
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return report.to_dict()
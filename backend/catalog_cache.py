@@ -0,0 +1,183 @@
+"""In-process read-through cache for catalog reads.
+
+Entries expire after a TTL and the least recently used entry is evicted once
+the cache is full. Writes made by this process invalidate precisely; writes
+made by other workers reach us through an optional change stream.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def product_key(product_id: str) -> tuple:
+    return ("product", product_id)
+
+
+def listing_key(filter_dict: Dict[str, Any], limit: int, cursor: Optional[str] = None) -> tuple:
+    return ("products", tuple(sorted(filter_dict.items())), limit, cursor)
+
+
+# Updates touching nothing but these leave cached entries alone
+_VOLATILE_FIELDS = {"stock"}
+
+
+def _stock_only(change: dict) -> bool:
+    """Every add to cart, release and sweep moves `stock` (see inventory.py).
+    Dropping the hottest products on each of those would defeat the cache,
+    so cached stock is allowed to lag by up to the TTL; the cart and
+    /products/{id}/stock read it live."""
+    if change["operationType"] != "update":
+        return False
+    description = change.get("updateDescription") or {}
+    updated = set(description.get("updatedFields") or {})
+    return bool(updated) and updated <= _VOLATILE_FIELDS and not description.get("removedFields")
+
+
+class CatalogCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        # key -> (expires_at, value)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Bumped on every invalidation so a load that raced with a write
+        # does not put the pre-write result back into the cache.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.misses += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for key, loading and caching it on a miss.
+
+        None results (e.g. an unknown product id) are not cached.
+        """
+        value = self.get(key)
+        if value is not _MISSING:
+            return value
+        generation = self._generation
+        value = await loader()
+        if value is not None and generation == self._generation:
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        self._generation += 1
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def invalidate_product(self, product_id: str, document: Optional[dict] = None) -> None:
+        """Drop everything a change to one product can make stale.
+
+        That is the product itself, every cached listing that currently
+        contains it (it may have left the filter or changed), and, when the
+        new document is known, every listing whose filter it now matches (it
+        may have joined).
+        """
+        self._generation += 1
+        stale = []
+        for key, (_, value) in self._entries.items():
+            if key == product_key(product_id):
+                stale.append(key)
+            elif key[0] == "products":
+                filter_items = key[1]
+                if any(p["id"] == product_id for p in value):
+                    stale.append(key)
+                elif document is not None and all(document.get(f) == v for f, v in filter_items):
+                    stale.append(key)
+        for key in stale:
+            del self._entries[key]
+        self.invalidations += len(stale)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    async def watch(self, collection, pre_images: bool = False, retry_delay: float = 5.0) -> None:
+        """Follow a change stream on the products collection and invalidate.
+
+        Needs a replica set. Delete events only carry `_id`, so unless
+        pre_images is set (MongoDB 6.0+ with changeStreamPreAndPostImages
+        enabled on the collection) the whole cache is dropped for them.
+        Whenever the stream breaks the cache is cleared as well, since
+        events may have been missed.
+        """
+        options = {"full_document": "updateLookup"}
+        if pre_images:
+            options["full_document_before_change"] = "whenAvailable"
+        while True:
+            try:
+                async with collection.watch(**options) as stream:
+                    async for change in stream:
+                        self._apply_change(change)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning("Catalog change stream interrupted: %s", e)
+            self.clear()
+            await asyncio.sleep(retry_delay)
+
+    def _apply_change(self, change: dict) -> None:
+        if change["operationType"] in ("drop", "rename", "dropDatabase", "invalidate"):
+            self.clear()
+            return
+        if _stock_only(change):
+            return
+        before = change.get("fullDocumentBeforeChange")
+        after = change.get("fullDocument")
+        product = after or before
+        if product is None or "id" not in product:
+            self.clear()
+            return
+        self.invalidate_product(product["id"], after)
@@ -0,0 +1,128 @@
+"""Turning a cart into an order.
+
+Everything happens in one transaction: the order is inserted, the stock
+the session reserved (see inventory.py) is consumed, any shortfall from
+an expired reservation is taken from stock now, and the cart is emptied.
+Either all of it is applied or none of it.
+
+Clients send an Idempotency-Key with each checkout attempt and reuse it
+when retrying. The key is stored on the order, unique per session, so a
+retry (or a duplicate racing the original) gets the order that was
+already placed instead of a second one.
+"""
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from inventory import return_stock, take_stock
+from transactions import run_in_transaction
+
+ORDER_PRODUCT_FIELDS = {"_id": 0, "id": 1, "name": 1, "price": 1}
+
+
+class CheckoutError(Exception):
+    """The cart cannot be checked out as it is; nothing was changed."""
+
+    def __init__(self, message: str, product_id: Optional[str] = None):
+        super().__init__(message)
+        self.product_id = product_id
+
+
+async def find_order(db, session_id: str, idempotency_key: str, session=None) -> Optional[Dict[str, Any]]:
+    return await db.orders.find_one(
+        {"session_id": session_id, "idempotency_key": idempotency_key}, {"_id": 0}, session=session
+    )
+
+
+async def _place_order(db, session, session_id: str, idempotency_key: Optional[str],
+                       cart_update: Dict[str, Any], on_placed) -> Dict[str, Any]:
+    if idempotency_key is not None:
+        # Checked in the transaction: a duplicate that lost a write conflict
+        # to the original is retried and finds its order here
+        existing = await find_order(db, session_id, idempotency_key, session=session)
+        if existing is not None:
+            return existing
+    cart = await db.carts.find_one({"session_id": session_id}, {"_id": 0}, session=session)
+    if not cart or not cart["items"]:
+        raise CheckoutError("Cart is empty")
+
+    needed = Counter()
+    for line in cart["items"]:
+        needed[line["product_id"]] += line["quantity"]
+    products = {
+        product["id"]: product
+        async for product in db.products.find(
+            {"id": {"$in": list(needed)}}, ORDER_PRODUCT_FIELDS, session=session
+        )
+    }
+    held = {
+        reservation["product_id"]: reservation["quantity"]
+        async for reservation in db.reservations.find({"session_id": session_id}, session=session)
+    }
+
+    for product_id in needed.keys() | held.keys():
+        if product_id in needed and product_id not in products:
+            raise CheckoutError("Product is no longer sold", product_id)
+        difference = needed[product_id] - held.get(product_id, 0)
+        if difference > 0:
+            # The reservation expired or fell short; take the rest now
+            if not await take_stock(db.products, product_id, difference, session=session):
+                raise CheckoutError("Not enough stock", product_id)
+        elif difference < 0:
+            await return_stock(db.products, product_id, -difference, session=session)
+    await db.reservations.delete_many({"session_id": session_id}, session=session)
+
+    now = datetime.utcnow()
+    items = [
+        {
+            "product_id": line["product_id"],
+            "name": products[line["product_id"]]["name"],
+            "price": products[line["product_id"]]["price"],
+            "quantity": line["quantity"],
+            "selected_color": line["selected_color"],
+            "line_total": products[line["product_id"]]["price"] * line["quantity"],
+        }
+        for line in cart["items"]
+    ]
+    order = {
+        "id": str(uuid.uuid4()),
+        "session_id": session_id,
+        "user_id": cart.get("user_id"),
+        "items": items,
+        "subtotal": sum(item["line_total"] for item in items),
+        "status": "placed",
+        "idempotency_key": idempotency_key,
+        "created_at": now,
+    }
+    await db.orders.insert_one(dict(order), session=session)
+    await db.carts.update_one({"session_id": session_id}, {"$set": {"items": [], **cart_update}}, session=session)
+    if on_placed is not None:
+        await on_placed(order, session)
+    return order
+
+
+async def checkout(client, db, session_id: str, idempotency_key: Optional[str],
+                   cart_touch: Callable[[datetime], Dict[str, Any]],
+                   on_placed: Optional[Callable[[Dict[str, Any], Any], Awaitable[None]]] = None) -> Dict[str, Any]:
+    """Place an order for the session's cart, or return the one already
+    placed with this idempotency key. Raises CheckoutError.
+
+    `on_placed(order, session)` runs in the transaction after the order is
+    written, e.g. to enqueue follow-up jobs that commit with it.
+    """
+    async def place(session):
+        return await _place_order(
+            db, session, session_id, idempotency_key, cart_touch(datetime.utcnow()), on_placed
+        )
+
+    try:
+        return await run_in_transaction(client, place)
+    except DuplicateKeyError:
+        # A concurrent request with the same key committed first
+        existing = await find_order(db, session_id, idempotency_key) if idempotency_key else None
+        if existing is None:
+            raise
+        return existing
@@ -0,0 +1,102 @@
+"""Command line tools for the store backend.
+
+    python cli.py import-products feed.ndjson --batch-size 1000
+"""
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+import typer
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from bulk_import import FORMATS, import_products, read_records
+from redis_cache import create_redis_cache
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+app = typer.Typer(help="3D Tech Store backend tools")
+
+
+@app.callback()
+def main():
+    """3D Tech Store backend tools."""
+
+
+async def _file_lines(path: Path):
+    with path.open(encoding="utf-8-sig", newline="") as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+@app.command("import-products")
+def import_products_command(
+    path: Path = typer.Argument(..., exists=True, dir_okay=False, help="CSV, JSON or NDJSON file"),
+    format: Optional[str] = typer.Option(None, help=f"One of {', '.join(FORMATS)}; guessed from the file extension by default"),
+    batch_size: int = typer.Option(500, min=1, help="Rows per bulk_write"),
+    concurrency: int = typer.Option(1, min=1, help="Batches written at once"),
+    errors_only: bool = typer.Option(False, help="Only print rows that failed"),
+):
+    """Create or update products from a supplier feed."""
+    # Imported here so that --help does not have to build the API app
+    from server import Product, ProductCreate, search_fields
+
+    fmt = format or path.suffix.lstrip(".").lower()
+    if fmt not in FORMATS:
+        raise typer.BadParameter(f"cannot tell the format of {path.name}; pass --format")
+
+    async def run():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ['DB_NAME']]
+        try:
+            report = await import_products(
+                db.products,
+                read_records(_file_lines(path), fmt),
+                ProductCreate, Product,
+                batch_size=batch_size, concurrency=concurrency, enrich=search_fields,
+                reservations=db.reservations,
+            )
+        finally:
+            client.close()
+        # Other processes only see the new catalog once their caches drop it
+        redis_cache = create_redis_cache(os.environ.get('REDIS_URL'))
+        if redis_cache is not None:
+            await redis_cache.invalidate("products")
+            await redis_cache.close()
+        return report
+
+    report = asyncio.run(run())
+    if errors_only:
+        report["results"] = [r for r in report["results"] if r["status"] == "failed"]
+    typer.echo(json.dumps(report, ensure_ascii=False, indent=2))
+    if report["failed"]:
+        raise typer.Exit(code=1)
+
+
+@app.command("expire-legacy-carts")
+def expire_legacy_carts_command():
+    """Give carts written before TTL expiry existed an expires_at."""
+    from server import CART_RETENTION
+
+    async def run():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        try:
+            # Same deadline the cart would have got on its last write
+            result = await client[os.environ['DB_NAME']].carts.update_many(
+                {"expires_at": {"$exists": False}},
+                [{"$set": {"expires_at": {"$add": [
+                    "$updated_at", int(CART_RETENTION.total_seconds() * 1000)
+                ]}}}],
+            )
+        finally:
+            client.close()
+        return result.modified_count
+
+    typer.echo(f"Set expires_at on {asyncio.run(run())} carts")
+
+
+if __name__ == "__main__":
+    app()
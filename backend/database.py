@@ -0,0 +1,88 @@
+"""MongoDB client settings and lifecycle helpers.
+
+Pool settings come from the environment; anything left unset falls back to
+the connection string and then to the driver's defaults:
+
+    MONGO_MAX_POOL_SIZE                connections per server (driver: 100)
+    MONGO_MIN_POOL_SIZE                idle connections kept open (driver: 0)
+    MONGO_MAX_IDLE_TIME_MS             close connections idle this long
+    MONGO_WAIT_QUEUE_TIMEOUT_MS        fail a checkout after waiting this long
+                                       for a free connection (driver: wait forever)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS  fail when no suitable server is found
+                                       within this long (driver: 30000)
+    MONGO_COMPRESSORS                  e.g. "zstd,snappy,zlib"; zstd needs the
+                                       zstandard package, snappy python-snappy
+    MONGO_READ_PREFERENCE              e.g. "primary", "secondaryPreferred"
+    MONGO_PREWARM_CONNECTIONS          connections opened before serving
+                                       (defaults to the minimum pool size)
+
+Catalog reads that can tolerate replication lag have their own read
+preference (see catalog_read_preference):
+
+    MONGO_CATALOG_READ_PREFERENCE        default "secondaryPreferred"
+    MONGO_CATALOG_MAX_STALENESS_SECONDS  skip secondaries lagging more than this;
+                                         default 90, the smallest the driver
+                                         accepts, -1 for no bound
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict
+
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+logger = logging.getLogger(__name__)
+
+# Environment variable -> (client option, parser)
+_OPTIONS = {
+    'MONGO_MAX_POOL_SIZE': ('maxPoolSize', int),
+    'MONGO_MIN_POOL_SIZE': ('minPoolSize', int),
+    'MONGO_MAX_IDLE_TIME_MS': ('maxIdleTimeMS', int),
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': ('waitQueueTimeoutMS', int),
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': ('serverSelectionTimeoutMS', int),
+    'MONGO_COMPRESSORS': ('compressors', str),
+    'MONGO_READ_PREFERENCE': ('readPreference', str),
+}
+
+
+def client_options(environ=os.environ) -> Dict[str, Any]:
+    """Keyword arguments for the Motor client from the environment."""
+    options = {}
+    for variable, (option, parse) in _OPTIONS.items():
+        value = environ.get(variable, '').strip()
+        if value:
+            options[option] = parse(value)
+    return options
+
+
+_READ_PREFERENCES = {
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+
+def catalog_read_preference(environ=os.environ):
+    mode = environ.get('MONGO_CATALOG_READ_PREFERENCE', 'secondaryPreferred')
+    if mode == 'primary':
+        return Primary()
+    if mode not in _READ_PREFERENCES:
+        raise ValueError(f"Unknown MONGO_CATALOG_READ_PREFERENCE '{mode}'")
+    max_staleness = int(environ.get('MONGO_CATALOG_MAX_STALENESS_SECONDS', '90'))
+    return _READ_PREFERENCES[mode](max_staleness=max_staleness)
+
+
+def prewarm_connections(options: Dict[str, Any], environ=os.environ) -> int:
+    return int(environ.get('MONGO_PREWARM_CONNECTIONS', options.get('minPoolSize', 0)))
+
+
+async def prewarm_pool(client, connections: int) -> None:
+    """Open up to `connections` pooled connections before serving traffic.
+
+    Concurrent pings each need a connection of their own, so the first
+    requests do not pay for TCP, TLS and authentication handshakes. Always
+    pings once, which also fails startup early if MongoDB is unreachable.
+    """
+    await asyncio.gather(*(client.admin.command('ping') for _ in range(max(connections, 1))))
+    logger.info("Pre-warmed MongoDB pool with %d concurrent pings", max(connections, 1))
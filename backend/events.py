@@ -0,0 +1,104 @@
+"""Product view and add-to-cart counting.
+
+Recording an event only bumps an in-memory counter; nothing is written
+per request. The buffer is flushed every few seconds (or sooner once it
+tracks many products) as one unordered bulk write of $inc upserts into
+`product_events`, one document per product and hour, so thousands of
+events cost a handful of writes. trending.py aggregates those hourly
+counters.
+
+Counts still buffered when a worker dies are lost, which is acceptable
+for popularity signals. A failed flush puts its counts back to be
+retried, up to a bound, beyond which new events are dropped and counted.
+"""
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+VIEW = "views"
+CART_ADD = "cart_adds"
+KINDS = (VIEW, CART_ADD)
+
+
+def hour_of(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class EventBuffer:
+    def __init__(self, max_keys: int = 5000, retention: timedelta = timedelta(days=8)):
+        # Distinct (product, hour, kind) counters held before events are dropped
+        self.max_keys = max_keys
+        # How long hourly counters are kept; a TTL index removes them after
+        self.retention = retention
+        self._counts: Counter = Counter()
+        self._full = asyncio.Event()
+        self.stats = {"recorded": 0, "dropped": 0, "flushes": 0, "written": 0, "errors": 0}
+
+    def record(self, product_id: str, kind: str, count: int = 1) -> None:
+        key = (product_id, hour_of(datetime.utcnow()), kind)
+        if key not in self._counts and len(self._counts) >= self.max_keys:
+            self.stats["dropped"] += count
+            return
+        self._counts[key] += count
+        self.stats["recorded"] += count
+        if len(self._counts) >= self.max_keys // 2:
+            self._full.set()
+
+    def _updates(self, counts: Dict[Tuple[str, datetime, str], int]):
+        per_document: Dict[Tuple[str, datetime], Counter] = {}
+        for (product_id, hour, kind), count in counts.items():
+            per_document.setdefault((product_id, hour), Counter())[kind] += count
+        return [
+            UpdateOne(
+                {"product_id": product_id, "hour": hour},
+                {"$inc": dict(increments), "$setOnInsert": {"expires_at": hour + self.retention}},
+                upsert=True,
+            )
+            for (product_id, hour), increments in per_document.items()
+        ]
+
+    async def flush(self, collection) -> int:
+        """Write everything buffered so far; returns how many documents."""
+        counts, self._counts = self._counts, Counter()
+        self._full.clear()
+        if not counts:
+            return 0
+        updates = self._updates(counts)
+        try:
+            await collection.bulk_write(updates, ordered=False)
+        except PyMongoError:
+            # $inc is not idempotent, so a partly applied batch may count
+            # some events twice when retried; better than losing them all
+            self.stats["errors"] += 1
+            for key, count in counts.items():
+                if key in self._counts or len(self._counts) < self.max_keys:
+                    self._counts[key] += count
+                else:
+                    self.stats["dropped"] += count
+            raise
+        self.stats["flushes"] += 1
+        self.stats["written"] += len(updates)
+        return len(updates)
+
+    async def flush_periodically(self, collection, interval: float) -> None:
+        """Flush every `interval` seconds, or as soon as the buffer fills up,
+        until cancelled; a final flush is left to the caller."""
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush(collection)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Flushing product events failed")
+                await asyncio.sleep(interval)
@@ -0,0 +1,53 @@
+"""Gunicorn settings for running the API with several uvicorn workers.
+
+    gunicorn server:app -c gunicorn.conf.py
+
+WEB_CONCURRENCY overrides the worker count, which defaults to the CPUs this
+process may run on. Send HUP to the master to replace the workers one
+generation at a time: the master keeps the listening socket open, new
+workers start accepting before the old ones are told to stop, and old
+workers finish their in-flight requests (up to GRACEFUL_TIMEOUT seconds).
+"""
+import os
+import shutil
+import tempfile
+
+
+def _cpu_count() -> int:
+    # Honours CPU pinning, which os.cpu_count() does not
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+workers = int(os.environ.get("WEB_CONCURRENCY", _cpu_count()))
+# Uses uvloop and httptools when they are installed
+worker_class = "uvicorn.workers.UvicornWorker"
+# Each worker opens its own Motor client, which must not cross a fork
+preload_app = False
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+# Longer than nginx's upstream keepalive, so the proxy closes idle connections first
+keepalive = int(os.environ.get("KEEPALIVE_TIMEOUT", "75"))
+max_requests = int(os.environ.get("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", "0"))
+accesslog = None
+errorlog = "-"
+
+# Workers write Prometheus samples to files in this directory and /metrics
+# aggregates them; see metrics.py.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "prometheus-multiproc"))
+
+
+def on_starting(server):
+    # Samples from a previous run would be added to this one's
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
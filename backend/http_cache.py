@@ -0,0 +1,59 @@
+"""HTTP validators and conditional GET for catalog responses.
+
+The ETag is a hash of the exact response body, so it is strong and changes
+whenever any byte of the representation does, for single products and
+listing pages alike. Last-Modified is only sent for single products: a
+listing can change (a product deleted or moved out of the filter) without
+any remaining product's updated_at moving.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Mapping, Optional
+
+
+def etag(content: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def cache_control(max_age: int, shared_max_age: int) -> str:
+    return f"public, max-age={max_age}, s-maxage={shared_max_age}"
+
+
+def _opaque(tag: str) -> str:
+    # If-None-Match uses weak comparison, and a compressing proxy may have
+    # turned our strong ETag into a weak one on the way out
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def not_modified(headers: Mapping[str, str], current_etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Whether a GET carrying these request headers can be answered with 304.
+
+    If-None-Match wins over If-Modified-Since when both are sent (RFC 9110).
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return _opaque(current_etag) in {_opaque(tag) for tag in if_none_match.split(",")}
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # HTTP dates have whole-second precision
+    return last_modified.replace(microsecond=0) <= since
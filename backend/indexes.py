@@ -0,0 +1,215 @@
+"""Index declarations for every collection the API queries, and the startup
+bootstrap that creates them and reports drift."""
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Every lookup in server.py goes through the application-level `id`,
+# `session_id` or `email` field, never through `_id`.
+REQUIRED_INDEXES: Dict[str, List[IndexModel]] = {
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # get_products filters on category, product_type and featured in any
+        # combination and pages in `id` order (keyset pagination), so every
+        # index here ends in id and a page is read in order, never sorted in
+        # memory. All three filters seek straight to the page; one filter
+        # (the homepage's ?featured=true, ?category=, ?product_type=) uses
+        # its single-field index; two filters walk the index of one of them
+        # and check the other per document.
+        IndexModel(
+            [("category", ASCENDING), ("product_type", ASCENDING), ("featured", ASCENDING), ("id", ASCENDING)],
+            name="category_product_type_featured_id",
+        ),
+        IndexModel([("category", ASCENDING), ("id", ASCENDING)], name="category_id"),
+        IndexModel([("featured", ASCENDING), ("id", ASCENDING)], name="featured_id"),
+        IndexModel([("product_type", ASCENDING), ("id", ASCENDING)], name="product_type_id"),
+        # trending.py pads a category's list with its featured products first
+        IndexModel([("category", ASCENDING), ("featured", ASCENDING), ("id", ASCENDING)],
+                   name="category_featured_id"),
+        # /products/search; see search.py for why this is not name/description
+        IndexModel([("search_text", TEXT)], name="search_text", default_language="none"),
+    ],
+    "carts": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("session_id", ASCENDING)], name="session_id_unique", unique=True),
+        # Abandoned guest carts; each cart write sets expires_at, see CART_RETENTION
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "reservations": [
+        IndexModel([("session_id", ASCENDING), ("product_id", ASCENDING)],
+                   name="session_id_product_id_unique", unique=True),
+        # Swept by inventory.release_expired, which must return the stock,
+        # so this is deliberately not a TTL index
+        IndexModel([("expires_at", ASCENDING)], name="expires_at"),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # checkout.py: one order per Idempotency-Key and session; orders
+        # placed without a key (stored as null) are not constrained
+        IndexModel(
+            [("session_id", ASCENDING), ("idempotency_key", ASCENDING)],
+            name="session_id_idempotency_key_unique",
+            unique=True,
+            partialFilterExpression={"idempotency_key": {"$type": "string"}},
+        ),
+    ],
+    "product_events": [
+        # events.py upserts one counter document per product and hour
+        IndexModel([("product_id", ASCENDING), ("hour", ASCENDING)], name="product_id_hour_unique", unique=True),
+        # trending.py sums the counters of a time window
+        IndexModel([("hour", ASCENDING)], name="hour"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "merchandising": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "leases": [
+        # trending.hold_lease: the upsert that takes a lease is the check
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # jobs.py claims the earliest due job of a status and counts by status
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+        # Set on finished jobs only; failed ones stay until looked at
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "seed_markers": [
+        # seeding.claim_marker: the insert that claims a seed is the check
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "status_checks": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # keyset pagination order for get_status_checks
+        IndexModel([("timestamp", ASCENDING), ("id", ASCENDING)], name="timestamp_id"),
+    ],
+}
+
+# Options that change how an index behaves; anything else reported by
+# index_information() (v, ns, background...) is ignored when diffing.
+_COMPARED_OPTIONS = (
+    "unique", "sparse", "expireAfterSeconds", "partialFilterExpression", "default_language",
+)
+
+
+class IndexBootstrapError(RuntimeError):
+    """Raised when a required index is missing after bootstrap."""
+
+
+@dataclass
+class IndexDrift:
+    collection: str
+    name: str
+    problem: str
+    # A blocking drift means the declared index cannot do its job (absent,
+    # or present without the uniqueness the endpoints rely on).
+    blocking: bool = False
+
+    def __str__(self) -> str:
+        return f"{self.collection}.{self.name}: {self.problem}"
+
+
+def _normalize_key(key, weights: Optional[dict] = None) -> List[tuple]:
+    items = list(key.items() if hasattr(key, "items") else key)
+    if weights is not None:
+        # The server reports a text index as _fts/_ftsx plus per-field weights
+        text = [(field, TEXT) for field in sorted(weights)]
+        items = [item for item in items if item[0] not in ("_fts", "_ftsx")]
+        return text + _normalize_key(items)
+    if any(direction == TEXT for _, direction in items):
+        return ([(field, TEXT) for field, direction in sorted(items) if direction == TEXT]
+                + _normalize_key([item for item in items if item[1] != TEXT]))
+    return [(field, int(direction) if isinstance(direction, (int, float)) else direction)
+            for field, direction in items]
+
+
+def _options(spec: dict) -> dict:
+    return {opt: spec[opt] for opt in _COMPARED_OPTIONS if opt in spec}
+
+
+def _find_existing(declared: dict, existing: Dict[str, dict]):
+    """Match a declared index to an existing one by name, then by key pattern."""
+    if declared["name"] in existing:
+        return declared["name"], existing[declared["name"]]
+    key = _normalize_key(declared["key"])
+    for name, info in existing.items():
+        if _normalize_key(info["key"], info.get("weights")) == key:
+            return name, info
+    return None, None
+
+
+async def diff_indexes(db, required: Dict[str, List[IndexModel]] = REQUIRED_INDEXES) -> List[IndexDrift]:
+    """Compare the declared indexes with what the server actually has."""
+    drift = []
+    for collection_name, models in required.items():
+        existing = await db[collection_name].index_information()
+        declared_names = set()
+        for model in models:
+            declared = model.document
+            declared_names.add(declared["name"])
+            name, info = _find_existing(declared, existing)
+            if info is None:
+                drift.append(IndexDrift(collection_name, declared["name"], "missing", blocking=True))
+                continue
+            if name != declared["name"]:
+                drift.append(IndexDrift(collection_name, declared["name"], f"present under name '{name}'"))
+            if _normalize_key(info["key"], info.get("weights")) != _normalize_key(declared["key"]):
+                drift.append(IndexDrift(collection_name, declared["name"], f"key differs: {info['key']}"))
+            if _options(info) != _options(declared):
+                drift.append(IndexDrift(
+                    collection_name, declared["name"],
+                    f"options differ: expected {_options(declared)}, found {_options(info)}",
+                    blocking=True,
+                ))
+        for name in existing:
+            if name != "_id_" and name not in declared_names and not any(
+                _normalize_key(existing[name]["key"], existing[name].get("weights")) == _normalize_key(m.document["key"]) for m in models
+            ):
+                drift.append(IndexDrift(collection_name, name, "not declared"))
+    return drift
+
+
+async def ensure_indexes(
+    db,
+    required: Dict[str, List[IndexModel]] = REQUIRED_INDEXES,
+    create: bool = True,
+) -> List[IndexDrift]:
+    """Create missing indexes and verify every required one is present.
+
+    Creation is idempotent: indexes that already exist with the same spec are
+    left alone. Anything that differs from the declaration is logged as drift
+    rather than dropped, so a misconfigured deployment is never "fixed" by
+    rebuilding a large index at startup. Raises IndexBootstrapError when a
+    required index is still missing, or exists with the wrong options,
+    afterwards.
+    """
+    if create:
+        for drift in await diff_indexes(db, required):
+            if drift.problem != "missing":
+                continue
+            model = next(m for m in required[drift.collection] if m.document["name"] == drift.name)
+            try:
+                await db[drift.collection].create_indexes([model])
+                logger.info("Created index %s.%s", drift.collection, drift.name)
+            except OperationFailure as e:
+                logger.error("Could not create index %s.%s: %s", drift.collection, drift.name, e)
+
+    drift = await diff_indexes(db, required)
+    for item in drift:
+        logger.warning("Index drift: %s", item)
+
+    blocking = [item for item in drift if item.blocking]
+    if blocking:
+        raise IndexBootstrapError(
+            "Required indexes are missing or misconfigured: " + ", ".join(str(item) for item in blocking)
+        )
+    return drift
@@ -0,0 +1,166 @@
+"""Stock reservations.
+
+A product's `stock` is what is still available to buy. Adding to a cart
+takes stock with a conditional decrement ({"stock": {"$gte": qty}} plus
+$inc), which MongoDB applies atomically per document, so concurrent
+buyers can never take more than there is. What a session holds is kept
+in `reservations`, one document per session and product, until it is
+released, converted into an order, or expires and is swept back into
+stock.
+
+Setting stock from outside (a product update or a bulk import) states
+the units on hand, which include those held in carts; `available` turns
+that into what is left to sell, so held units are not sold twice.
+
+Stock is taken before the reservation is recorded. A crash between the
+two writes leaves stock held by nobody (an undersell, fixed by a stock
+correction) rather than a reservation backed by no stock (an oversell).
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id: str, requested: int):
+        super().__init__(f"Not enough stock of {product_id} for {requested} more")
+        self.product_id = product_id
+        self.requested = requested
+
+
+async def held(reservations, product_ids: List[str]) -> Dict[str, int]:
+    """Units of each product currently held in carts."""
+    if not product_ids:
+        return {}
+    pipeline = [
+        {"$match": {"product_id": {"$in": product_ids}}},
+        {"$group": {"_id": "$product_id", "quantity": {"$sum": "$quantity"}}},
+    ]
+    return {hold["_id"]: hold["quantity"] async for hold in reservations.aggregate(pipeline)}
+
+
+def available(on_hand: int, held_quantity: int) -> int:
+    """The stock to store for `on_hand` units of which `held_quantity` are in carts."""
+    return max(0, on_hand - held_quantity)
+
+
+async def take_stock(products, product_id: str, quantity: int, session=None) -> bool:
+    """Decrement stock by quantity if at least that much is available."""
+    taken = await products.find_one_and_update(
+        {"id": product_id, "stock": {"$gte": quantity}},
+        {"$inc": {"stock": -quantity}},
+        projection={"_id": 1},
+        session=session,
+    )
+    return taken is not None
+
+
+async def return_stock(products, product_id: str, quantity: int, session=None) -> None:
+    if quantity > 0:
+        await products.update_one({"id": product_id}, {"$inc": {"stock": quantity}}, session=session)
+
+
+async def reserve(db, session_id: str, product_id: str, quantity: int, hold: timedelta) -> dict:
+    """Hold `quantity` more of a product for a session, or raise OutOfStock.
+
+    Every reservation the session makes pushes its expiry back by `hold`.
+    """
+    if not await take_stock(db.products, product_id, quantity):
+        raise OutOfStock(product_id, quantity)
+
+    now = datetime.utcnow()
+    update = {
+        "$inc": {"quantity": quantity},
+        "$set": {"updated_at": now, "expires_at": now + hold},
+        "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": now},
+    }
+    try:
+        for attempt in range(2):
+            try:
+                return await db.reservations.find_one_and_update(
+                    {"session_id": session_id, "product_id": product_id},
+                    update,
+                    projection={"_id": 0},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+            except DuplicateKeyError:
+                # Two first reservations of the same product raced to insert;
+                # the loser's retry updates the winner's document
+                if attempt:
+                    raise
+    except BaseException:
+        await return_stock(db.products, product_id, quantity)
+        raise
+
+
+async def release(db, session_id: str, product_id: str, quantity: Optional[int] = None) -> int:
+    """Give back up to `quantity` (default: all) of what a session holds of a
+    product, returning how much went back into stock."""
+    query = {"session_id": session_id, "product_id": product_id}
+    if quantity is None:
+        reservation = await db.reservations.find_one_and_delete(query, projection={"quantity": 1})
+        released = reservation["quantity"] if reservation else 0
+    else:
+        # Claim the quantity first, so two releases cannot both return it
+        reservation = await db.reservations.find_one_and_update(
+            {**query, "quantity": {"$gte": quantity}},
+            {"$inc": {"quantity": -quantity}},
+            projection={"quantity": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if reservation is None:
+            # Holds less than asked (partly expired or never reserved)
+            return await release(db, session_id, product_id)
+        released = quantity
+        if reservation["quantity"] == 0:
+            await db.reservations.delete_one({"_id": reservation["_id"], "quantity": 0})
+    await return_stock(db.products, product_id, released)
+    return released
+
+
+async def release_expired(db, now: Optional[datetime] = None, batch_size: int = 500) -> int:
+    """Return the stock of every reservation past its expiry; returns how many.
+
+    Works through them `batch_size` at a time until none are left, so a
+    flash sale's worth of abandoned carts comes back in one sweep.
+    """
+    now = now or datetime.utcnow()
+    released = 0
+    while True:
+        candidates = await db.reservations.find(
+            {"expires_at": {"$lte": now}}, {"_id": 1}
+        ).limit(batch_size).to_list(batch_size)
+        for candidate in candidates:
+            # Deleting is the claim: a reservation renewed or released meanwhile
+            # no longer matches, and each one is returned exactly once
+            reservation = await db.reservations.find_one_and_delete(
+                {"_id": candidate["_id"], "expires_at": {"$lte": now}},
+                projection={"product_id": 1, "quantity": 1},
+            )
+            if reservation is not None:
+                await return_stock(db.products, reservation["product_id"], reservation["quantity"])
+                released += 1
+        if len(candidates) < batch_size:
+            return released
+
+
+async def sweep_expired(db, interval: float) -> None:
+    """Release expired reservations every `interval` seconds until cancelled."""
+    while True:
+        try:
+            released = await release_expired(db)
+            if released:
+                logger.info("Released %d expired stock reservations", released)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Sweeping expired stock reservations failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,241 @@
+"""Background jobs for side effects that need not delay the response.
+
+A handler enqueues a job (one insert into the `jobs` collection) and
+returns; workers in every app process claim due jobs and run them. Jobs
+live in MongoDB, so they survive restarts and are shared by all workers.
+
+- Claiming is one find_one_and_update from "queued" to "running", so each
+  job is taken by exactly one worker. A running job holds a lease; if its
+  worker dies, the lease runs out and the job is queued again. Delivery is
+  therefore at least once and handlers must be idempotent.
+- Each process runs at most `concurrency` jobs at a time and only claims
+  a job when a slot is free, so a backlog waits in the database rather
+  than in memory.
+- enqueue refuses new jobs with QueueFull once `max_depth` jobs are
+  queued, so a stalled handler cannot grow the queue without bound.
+  Essential jobs, such as one written in the same transaction as an
+  order, are always accepted.
+- Failures are retried with jittered exponential backoff up to
+  `max_attempts`, then left as "failed" for inspection. Finished jobs are
+  kept for `retention` and then removed by a TTL index.
+"""
+import asyncio
+import logging
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from metrics import JOB_DURATION, JOB_QUEUE_DEPTH, JOB_WAIT, JOBS_REJECTED
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class QueueFull(Exception):
+    def __init__(self, kind: str, depth: int):
+        super().__init__(f"Job queue is full ({depth} queued), not enqueueing {kind}")
+        self.kind = kind
+        self.depth = depth
+
+
+class JobQueue:
+    def __init__(
+        self,
+        concurrency: int = 4,
+        max_depth: int = 10000,
+        max_attempts: int = 5,
+        lease: timedelta = timedelta(seconds=60),
+        backoff: float = 1.0,
+        max_backoff: float = 300.0,
+        retention: timedelta = timedelta(days=1),
+        poll_interval: float = 1.0,
+    ):
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        # Longest a job may run; also how long a dead worker's jobs wait
+        self.lease = lease
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self.handlers: Dict[str, Handler] = {}
+        self.collection = None
+        # Queued jobs as last counted; enqueue checks it against max_depth
+        self.depth = 0
+        self._wake = asyncio.Event()
+        self._loops: Set[asyncio.Task] = set()
+        self._running: Set[asyncio.Task] = set()
+
+    def handler(self, kind: str):
+        """Register the coroutine function that runs jobs of this kind."""
+        def register(function: Handler) -> Handler:
+            self.handlers[kind] = function
+            return function
+        return register
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], delay: float = 0,
+                      session=None, essential: bool = False) -> str:
+        """Queue a job and return its id; raises QueueFull unless essential."""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        if not essential and self.depth >= self.max_depth:
+            JOBS_REJECTED.labels(kind).inc()
+            raise QueueFull(kind, self.depth)
+        now = datetime.utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "payload": payload,
+            "status": QUEUED,
+            "attempts": 0,
+            "run_at": now + timedelta(seconds=delay),
+            "created_at": now,
+        }
+        await self.collection.insert_one(job, session=session)
+        self.depth += 1
+        if not delay and session is None:
+            # Jobs written in a transaction are not visible until it commits
+            self._wake.set()
+        return job["id"]
+
+    def wake(self) -> None:
+        """Look for due jobs now, e.g. after committing a transaction that
+        enqueued some."""
+        self._wake.set()
+
+    def start(self, collection) -> None:
+        self.collection = collection
+        for loop in (self._work(), self._monitor()):
+            self._loops.add(asyncio.create_task(loop))
+
+    async def stop(self, grace: float) -> None:
+        """Stop claiming jobs and give running ones `grace` seconds to finish;
+        any still running are cancelled and rerun once their lease expires."""
+        for task in self._loops:
+            task.cancel()
+        await asyncio.gather(*self._loops, return_exceptions=True)
+        self._loops.clear()
+        if self._running:
+            _, unfinished = await asyncio.wait(self._running, timeout=grace)
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"status": QUEUED, "run_at": {"$lte": now}},
+            {"$set": {"status": RUNNING, "started_at": now, "locked_until": now + self.lease},
+             "$inc": {"attempts": 1}},
+            sort=[("run_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _work(self) -> None:
+        slots = asyncio.Semaphore(self.concurrency)
+        while True:
+            await slots.acquire()
+            self._wake.clear()
+            try:
+                job = await self._claim()
+            except PyMongoError:
+                logger.exception("Claiming a job failed")
+                job = None
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(self._run(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _run(self, job: dict) -> None:
+        kind = job["kind"]
+        JOB_WAIT.labels(kind).observe(max(0.0, (job["started_at"] - job["run_at"]).total_seconds()))
+        # Updates are fenced on the attempt, so a job whose lease expired and
+        # was claimed again is not finished twice
+        claimed = {"id": job["id"], "attempts": job["attempts"]}
+        start = time.perf_counter()
+        try:
+            handler = self.handlers.get(kind)
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind '{kind}'")
+            await asyncio.wait_for(handler(job["payload"]), self.lease.total_seconds())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            outcome = await self._failed(job, claimed, e)
+        else:
+            now = datetime.utcnow()
+            outcome = "succeeded"
+            await self._finish(claimed, {"status": DONE, "finished_at": now, "expires_at": now + self.retention})
+        JOB_DURATION.labels(kind, outcome).observe(time.perf_counter() - start)
+
+    async def _failed(self, job: dict, claimed: dict, error: Exception) -> str:
+        now = datetime.utcnow()
+        message = f"{type(error).__name__}: {error}"
+        if job["attempts"] >= self.max_attempts:
+            logger.error("Job %s (%s) failed for good after %d attempts: %s",
+                         job["id"], job["kind"], job["attempts"], message)
+            await self._finish(claimed, {"status": FAILED, "finished_at": now, "last_error": message})
+            return "failed"
+        delay = min(self.max_backoff, self.backoff * 2 ** (job["attempts"] - 1)) * random.uniform(0.5, 1)
+        logger.warning("Job %s (%s) failed, retrying in %.1fs: %s", job["id"], job["kind"], delay, message)
+        await self._finish(claimed, {
+            "status": QUEUED, "run_at": now + timedelta(seconds=delay), "last_error": message,
+        })
+        return "retried"
+
+    async def _finish(self, claimed: dict, fields: dict) -> None:
+        try:
+            await self.collection.update_one(
+                {**claimed, "status": RUNNING}, {"$set": fields, "$unset": {"locked_until": ""}}
+            )
+        except PyMongoError:
+            # The lease will run out and the job run again
+            logger.exception("Recording the outcome of job %s failed", claimed["id"])
+
+    async def _monitor(self, interval: float = 5.0) -> None:
+        """Requeue jobs whose lease expired and refresh the depth gauges."""
+        while True:
+            try:
+                now = datetime.utcnow()
+                expired = {"status": RUNNING, "locked_until": {"$lte": now}}
+                given_up = await self.collection.update_many(
+                    {**expired, "attempts": {"$gte": self.max_attempts}},
+                    {"$set": {"status": FAILED, "finished_at": now, "last_error": "lease expired"},
+                     "$unset": {"locked_until": ""}},
+                )
+                requeued = await self.collection.update_many(
+                    expired, {"$set": {"status": QUEUED, "run_at": now}, "$unset": {"locked_until": ""}},
+                )
+                if given_up.modified_count or requeued.modified_count:
+                    logger.warning("Workers stopped during %d jobs: requeued %d, gave up on the rest",
+                                   given_up.modified_count + requeued.modified_count, requeued.modified_count)
+                for status in (QUEUED, RUNNING, FAILED):
+                    count = await self.collection.count_documents({"status": status})
+                    JOB_QUEUE_DEPTH.labels(status).set(count)
+                    if status == QUEUED:
+                        self.depth = count
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Checking the job queue failed")
+            await asyncio.sleep(interval)
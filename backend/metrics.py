@@ -0,0 +1,234 @@
+"""Prometheus instrumentation for the API.
+
+- HTTP latency per route template (never per raw path, so label
+  cardinality is bounded by the number of routes).
+- MongoDB command latency per collection and command, from pymongo's
+  command monitoring.
+- Connection pool gauges from pymongo's pool monitoring.
+- Cache counters, read from the caches' own stats at scrape time.
+- Background job queue depth, wait before a job starts and run time per
+  job kind and outcome (see jobs.py).
+- Requests refused by the rate limits or the concurrency gate, by reason
+  (see admission.py).
+
+Under gunicorn (PROMETHEUS_MULTIPROC_DIR set) the HTTP and MongoDB metrics
+are aggregated across workers; the cache metrics describe the worker that
+answers the scrape, since each worker has its own in-process cache.
+
+The listeners run on Motor's worker threads and do no more than a dict
+operation and a histogram observation per event;
+benchmarks/bench_metrics_overhead.py measures the cost.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+from pymongo import monitoring
+
+# Latencies we care about sit between ~1ms and a few seconds
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests currently being served", ["method"],
+    multiprocess_mode="livesum",
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency by collection and command",
+    ["collection", "command"], buckets=LATENCY_BUCKETS,
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total", "Failed MongoDB commands by collection and command",
+    ["collection", "command"],
+)
+MONGO_POOL_CONNECTIONS = Gauge(
+    "mongo_pool_connections", "Open connections in the MongoDB pool", ["address"],
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_IN_USE = Gauge(
+    "mongo_pool_connections_in_use", "MongoDB connections checked out of the pool", ["address"],
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total", "Failed MongoDB connection checkouts", ["address", "reason"],
+)
+
+# Jobs wait for seconds to minutes when the queue backs up or retries
+JOB_BUCKETS = (.01, .05, .1, .5, 1, 5, 10, 30, 60, 300, 900, 3600)
+
+# Every worker counts the same shared queue, so report one of them
+JOB_QUEUE_DEPTH = Gauge(
+    "job_queue_depth", "Jobs in the background queue by status", ["status"],
+    multiprocess_mode="livemax",
+)
+JOB_WAIT = Histogram(
+    "job_wait_seconds", "Time from when a job was due until a worker started it", ["kind"],
+    buckets=JOB_BUCKETS,
+)
+JOB_DURATION = Histogram(
+    "job_duration_seconds", "Time spent running a job by kind and outcome", ["kind", "outcome"],
+    buckets=JOB_BUCKETS,
+)
+JOBS_REJECTED = Counter(
+    "jobs_rejected_total", "Jobs not enqueued because the queue was full", ["kind"],
+)
+
+# rate_limited (429), queue_full and queue_timeout (503)
+REQUESTS_SHED = Counter(
+    "http_requests_shed_total", "API requests refused before reaching a handler", ["reason"],
+)
+
+# Commands whose first value is not a collection name
+_NO_COLLECTION = {"ping", "hello", "isMaster", "ismaster", "endSessions", "buildInfo",
+                  "saslStart", "saslContinue", "killCursors", "commitTransaction", "abortTransaction"}
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.labels(method).inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.labels(method).dec()
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path_format", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(method, route, str(status)).observe(time.perf_counter() - start)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        # (connection, request id) -> collection, from started to finished
+        self._collections: Dict[tuple, str] = {}
+
+    def started(self, event):
+        name = event.command_name
+        if name in _NO_COLLECTION:
+            collection = "-"
+        elif name == "getMore":
+            collection = event.command.get("collection", "-")
+        else:
+            collection = event.command.get(name)
+            collection = collection if isinstance(collection, str) else "-"
+        self._collections[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "-")
+        MONGO_COMMAND_DURATION.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "-")
+        MONGO_COMMAND_DURATION.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def _address(self, event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(self._address(event)).set(0)
+        MONGO_POOL_IN_USE.labels(self._address(event)).set(0)
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(self._address(event)).inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(self._address(event)).dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.labels(self._address(event), str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_IN_USE.labels(self._address(event)).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_IN_USE.labels(self._address(event)).dec()
+
+
+class CacheCollector:
+    """Exposes the counters each cache already keeps, at scrape time."""
+
+    def __init__(self):
+        self._caches: Dict[str, Callable[[], dict]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, stats: Callable[[], dict]) -> None:
+        with self._lock:
+            self._caches[name] = stats
+
+    def collect(self):
+        counters = {
+            field: CounterMetricFamily(f"cache_{field}", f"Cache {field} by cache", labels=["cache"])
+            for field in ("hits", "misses", "evictions", "invalidations", "coalesced", "errors")
+        }
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Cache hits / lookups since start", labels=["cache"])
+        with self._lock:
+            caches = list(self._caches.items())
+        for name, stats in caches:
+            values = stats()
+            for field, family in counters.items():
+                if field in values:
+                    family.add_metric([name], values[field])
+            ratio.add_metric([name], values.get("hit_ratio", 0.0))
+        yield from counters.values()
+        yield ratio
+
+
+cache_collector = CacheCollector()
+REGISTRY.register(cache_collector)
+
+
+def event_listeners():
+    """Listeners to pass to the Mongo client's event_listeners."""
+    return [CommandMetrics(), PoolMetrics()]
+
+
+def render_metrics():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(cache_collector)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,133 @@
+"""Keyset (cursor) pagination and NDJSON streaming for list endpoints.
+
+A cursor is the opaque, URL-safe encoding of the sort-key values of the last
+item on a page, as plain JSON checked against the type of each sort key.
+The next page is fetched with a range query on those keys, so a page costs
+one index seek no matter how deep the client pages, as long as an index
+leads with the filtered fields and ends in the sort keys (see indexes.py);
+otherwise the server still walks past the documents the filter rejects.
+
+An NDJSON stream is a large page: it ends at the document a fixed number
+of places after the cursor, found before streaming starts, so the response
+headers can carry the cursor the next stream resumes from.
+"""
+import base64
+import json
+import math
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def wants_ndjson(accept: Optional[str]) -> bool:
+    return bool(accept) and NDJSON_MEDIA_TYPE in accept
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue."""
+
+
+class SortKey(NamedTuple):
+    """A field pages are sorted on and the type of its values: str, float
+    (any number) or datetime."""
+    field: str
+    type: type
+
+
+def _dump(value: Any, key: SortKey) -> Any:
+    return value.isoformat() if key.type is datetime else value
+
+
+def _load(value: Any, key: SortKey) -> Any:
+    # Only plain values of the expected type reach the query, never an
+    # operator document or anything else a client dressed up as a value
+    if key.type is str and isinstance(value, str):
+        return value
+    if (key.type is float and isinstance(value, (int, float)) and not isinstance(value, bool)
+            and math.isfinite(value)):
+        return value
+    if key.type is datetime and isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    raise InvalidCursor(f"cursor value for {key.field} is not a {key.type.__name__}")
+
+
+def encode_cursor(document: Dict[str, Any], sort_keys: Sequence[SortKey]) -> str:
+    values = [_dump(document[key.field], key) for key in sort_keys]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_keys: Sequence[SortKey]) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, RecursionError) as e:
+        raise InvalidCursor(str(e))
+    if not isinstance(values, list) or len(values) != len(sort_keys):
+        raise InvalidCursor("cursor does not match the sort order")
+    return [_load(value, key) for value, key in zip(values, sort_keys)]
+
+
+def _compare(sort_keys: Sequence[SortKey], values: Sequence[Any], op: str, last_op: str) -> Dict[str, Any]:
+    # (a, b) > (va, vb)  <=>  a > va  or  (a == va and b > vb)
+    clauses = []
+    for i, key in enumerate(sort_keys):
+        clause = {sort_keys[j].field: values[j] for j in range(i)}
+        clause[key.field] = {last_op if i == len(sort_keys) - 1 else op: values[i]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def _and(filter_dict: Dict[str, Any], clause: Dict[str, Any]) -> Dict[str, Any]:
+    return {"$and": [filter_dict, clause]} if filter_dict else clause
+
+
+def keyset_filter(
+    filter_dict: Dict[str, Any], sort_keys: Sequence[SortKey], cursor: Optional[str]
+) -> Dict[str, Any]:
+    """Restrict filter_dict to documents after the cursor in ascending sort order."""
+    if not cursor:
+        return filter_dict
+    return _and(filter_dict, _compare(sort_keys, decode_cursor(cursor, sort_keys), "$gt", "$gt"))
+
+
+def through_filter(
+    filter_dict: Dict[str, Any], sort_keys: Sequence[SortKey], last: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Restrict filter_dict to documents up to and including `last` in sort order."""
+    values = [last[key.field] for key in sort_keys]
+    return _and(filter_dict, _compare(sort_keys, values, "$lt", "$lte"))
+
+
+def next_cursor(page: Sequence[Any], limit: int, sort_keys: Sequence[SortKey]) -> Optional[str]:
+    """Cursor for the page after this one, or None if this is the last page."""
+    if not page or len(page) < limit:
+        return None
+    last = page[-1]
+    if not isinstance(last, dict):
+        last = {key.field: getattr(last, key.field) for key in sort_keys}
+    return encode_cursor(last, sort_keys)
+
+
+async def ndjson_stream(
+    cursor, encode: Callable[[Dict[str, Any]], bytes], batch_size: int = 500
+) -> AsyncIterator[bytes]:
+    """Yield a Motor cursor as NDJSON, one chunk per server batch.
+
+    Only one batch of documents is held in memory at a time.
+    """
+    cursor.batch_size(batch_size)
+    chunk = []
+    async for document in cursor:
+        chunk.append(encode(document))
+        chunk.append(b"\n")
+        if len(chunk) >= 2 * batch_size:
+            yield b"".join(chunk)
+            chunk = []
+    if chunk:
+        yield b"".join(chunk)
@@ -0,0 +1,182 @@
+"""Shared Redis caching tier for serialized API responses.
+
+Values are stored as the exact JSON bytes the API returns, so a hit is
+served without touching MongoDB or building any models. Invalidation is by
+namespace version: keys embed the current version of their namespace (the
+catalog, or one session's cart) and a write just bumps that version, which
+also makes a load that raced with the write land under a dead key.
+
+Misses are single-flight: concurrent misses in one worker share one load,
+and across workers a short Redis lock lets one worker load while the others
+poll for its result.
+"""
+import asyncio
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # pragma: no cover - redis is optional
+    aioredis = None
+    RedisError = Exception
+
+# Deletes the lock only if we still own it
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisCache:
+    def __init__(
+        self,
+        client,
+        prefix: str = "abcd:",
+        ttl_seconds: int = 60,
+        lock_timeout: float = 5.0,
+        lock_poll_interval: float = 0.02,
+    ):
+        self.client = client
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.lock_timeout = lock_timeout
+        self.lock_poll_interval = lock_poll_interval
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.lock_waits = 0
+        self.errors = 0
+
+    async def _version(self, namespace: str) -> int:
+        version = await self.client.get(f"{self.prefix}{namespace}:version")
+        return int(version) if version else 0
+
+    async def invalidate(self, namespace: str) -> None:
+        """Make every key in the namespace unreachable."""
+        version_key = f"{self.prefix}{namespace}:version"
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.incr(version_key)
+                # Outlive any value written under an older version
+                pipe.expire(version_key, self.ttl_seconds * 10)
+                await pipe.execute()
+        except RedisError as e:
+            self.errors += 1
+            logger.warning("Redis invalidation of %s failed: %s", namespace, e)
+
+    async def get_or_load(
+        self, namespace: str, key: str, loader: Callable[[], Awaitable[Optional[bytes]]]
+    ) -> Optional[bytes]:
+        """Return the cached bytes for key, loading them on a miss.
+
+        The cache fails open: if Redis is unreachable the loader is called
+        directly. None results are not cached.
+        """
+        try:
+            full_key = f"{self.prefix}{namespace}:{await self._version(namespace)}:{key}"
+            cached = await self.client.get(full_key)
+        except RedisError as e:
+            self.errors += 1
+            logger.warning("Redis read failed, falling back to MongoDB: %s", e)
+            return await loader()
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        inflight = self._inflight.get(full_key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            value = await self._load_with_lock(full_key, loader)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Don't warn about an exception nobody else awaited
+            future.exception()
+            raise
+        finally:
+            del self._inflight[full_key]
+
+    async def _load_with_lock(self, full_key: str, loader) -> Optional[bytes]:
+        lock_key = f"{full_key}:lock"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.client.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+        except RedisError as e:
+            self.errors += 1
+            logger.warning("Redis lock failed, loading without it: %s", e)
+            return await loader()
+
+        if not acquired:
+            # Another worker is loading this key; wait for its result, but
+            # never longer than the lock lifetime.
+            self.lock_waits += 1
+            deadline = asyncio.get_running_loop().time() + self.lock_timeout
+            while asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(self.lock_poll_interval)
+                try:
+                    cached = await self.client.get(full_key)
+                    if cached is not None:
+                        return cached
+                    if not await self.client.exists(lock_key):
+                        break
+                except RedisError:
+                    break
+            return await loader()
+
+        try:
+            value = await loader()
+            if value is not None:
+                await self.client.set(full_key, value, ex=self.ttl_seconds)
+            return value
+        finally:
+            try:
+                await self.client.eval(_RELEASE_LOCK, 1, lock_key, token)
+            except RedisError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "lock_waits": self.lock_waits,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_redis_cache(url: Optional[str], **kwargs) -> Optional[RedisCache]:
+    """Build the cache from a URL, or return None when caching is off.
+
+    `memory://` selects an in-process fakeredis server, for tests and local
+    development without a Redis instance.
+    """
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        try:
+            from fakeredis import aioredis as fake_aioredis
+        except ImportError:
+            raise RuntimeError("REDIS_URL=memory:// requires the fakeredis package")
+        return RedisCache(fake_aioredis.FakeRedis(), **kwargs)
+    if aioredis is None:
+        raise RuntimeError("REDIS_URL is set but the redis package is not installed")
+    return RedisCache(aioredis.from_url(url), **kwargs)
@@ -0,0 +1,117 @@
+"""Product full-text search with facet counts.
+
+MongoDB's text index has no Vietnamese analyzer, and its diacritic folding
+leaves letters such as "đ" alone, so "dien thoai" would never match "điện
+thoại". Each product therefore carries a `search_text` field holding its
+name and description folded to plain lowercase ASCII letters, indexed with
+language "none" (no stemming, no English stop words), and queries are folded
+the same way.
+"""
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+# Upper bounds of the price facet buckets, in VND; the last bucket is open
+# ended
+PRICE_BUCKETS = [1_000_000, 5_000_000, 10_000_000, 20_000_000, 50_000_000]
+_PRICE_BOUNDARIES = [0] + PRICE_BUCKETS + [float("inf")]
+# $bucket's default: negative, missing or non-numeric prices
+_OTHER_PRICES = "other"
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip diacritics, so that "Điện Thoại" becomes "dien thoai"."""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(c for c in decomposed if unicodedata.category(c) != "Mn").lower()
+
+
+def search_text(product: Dict[str, Any]) -> str:
+    return fold(f"{product.get('name', '')} {product.get('description', '')}")
+
+
+def _count_by(expression: str) -> List[Dict[str, Any]]:
+    # $sortByCount, with ties broken by value so facets are stable
+    return [
+        {"$group": {"_id": expression, "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+    ]
+
+
+def build_pipeline(
+    fields: Dict[str, int],
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    product_type: Optional[str] = None,
+    color: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    limit: int = 20,
+) -> List[Dict[str, Any]]:
+    """One aggregation returning the top matches and every facet's counts.
+
+    Facets are counted over everything matching the query and filters.
+    """
+    match: Dict[str, Any] = {}
+    if q and fold(q).strip():
+        match["$text"] = {"$search": fold(q)}
+    if category:
+        match["category"] = category
+    if product_type:
+        match["product_type"] = product_type
+    if color:
+        match["colors"] = color
+    if min_price is not None or max_price is not None:
+        match["price"] = {}
+        if min_price is not None:
+            match["price"]["$gte"] = min_price
+        if max_price is not None:
+            match["price"]["$lte"] = max_price
+
+    pipeline: List[Dict[str, Any]] = [{"$match": match}]
+    if "$text" in match:
+        pipeline.append({"$addFields": {"score": {"$meta": "textScore"}}})
+        sort = {"score": -1, "id": 1}
+        project = {**fields, "score": 1}
+    else:
+        sort = {"id": 1}
+        project = fields
+
+    return pipeline + [
+        {"$facet": {
+            "results": [{"$sort": sort}, {"$limit": limit}, {"$project": project}],
+            "total": [{"$count": "count"}],
+            "category": _count_by("$category"),
+            "product_type": _count_by("$product_type"),
+            "color": [{"$unwind": "$colors"}] + _count_by("$colors"),
+            "price": [{"$bucket": {
+                "groupBy": "$price",
+                "boundaries": _PRICE_BOUNDARIES,
+                "default": _OTHER_PRICES,
+                "output": {"count": {"$sum": 1}},
+            }}],
+        }},
+    ]
+
+
+def format_result(facet_output: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape the $facet output for the API."""
+    price = []
+    bounds = dict(zip(_PRICE_BOUNDARIES, _PRICE_BOUNDARIES[1:]))
+    for bucket in facet_output["price"]:
+        if bucket["_id"] == _OTHER_PRICES:
+            # Not a price range, so no bounds; kept so the counts add up
+            price.append({"min": None, "max": None, "other": True, "count": bucket["count"]})
+        else:
+            upper = bounds[bucket["_id"]]
+            price.append({"min": bucket["_id"], "max": None if upper == float("inf") else upper,
+                          "count": bucket["count"]})
+    return {
+        "total": facet_output["total"][0]["count"] if facet_output["total"] else 0,
+        "results": facet_output["results"],
+        "facets": {
+            "category": [{"value": f["_id"], "count": f["count"]} for f in facet_output["category"]],
+            "product_type": [{"value": f["_id"], "count": f["count"]} for f in facet_output["product_type"]],
+            "color": [{"value": f["_id"], "count": f["count"]} for f in facet_output["color"]],
+            "price": price,
+        },
+    }
@@ -0,0 +1,285 @@
+"""Sample data: the showcase catalog, and generated products, users and
+carts in any volume for benchmarks and staging.
+
+Generation is deterministic: the same seed yields the same documents and
+ids, so a run can be repeated, and rows already present are skipped (the
+unique id indexes reject them). Documents are generated lazily and
+written with unordered insert_many batches, `concurrency` at a time, so
+memory stays bounded by concurrency x batch size whatever the volume.
+
+Whether a database was seeded is recorded in a marker document in
+`seed_markers`, claimed with a single insert, so concurrent requests
+cannot both seed, and the emptiness check reads the collection count from
+metadata instead of counting documents.
+"""
+import asyncio
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# The products the storefront was designed around; one per 3D model type
+SHOWCASE_PRODUCTS = [
+    {
+        "name": "MacBook Pro M3",
+        "description": "Laptop cao cấp với chip M3 mạnh mẽ, màn hình Retina 14 inch tuyệt đẹp",
+        "price": 29999000,
+        "category": "Laptop",
+        "product_type": "laptop",
+        "colors": ["#C0C0C0", "#222222", "#FFD700"],
+        "stock": 25,
+        "featured": True
+    },
+    {
+        "name": "iPhone 15 Pro",
+        "description": "Smartphone flagship với camera Pro, chip A17 Pro và thiết kế titanium",
+        "price": 26999000,
+        "category": "Smartphone",
+        "product_type": "phone",
+        "colors": ["#C0C0C0", "#222222", "#0066CC", "#FFD700"],
+        "stock": 50,
+        "featured": True
+    },
+    {
+        "name": "AirPods Pro (2nd Gen)",
+        "description": "Tai nghe không dây cao cấp với chống ồn chủ động và âm thanh không gian",
+        "price": 5999000,
+        "category": "Audio",
+        "product_type": "headphones",
+        "colors": ["#FFFFFF", "#222222"],
+        "stock": 100,
+        "featured": True
+    },
+    {
+        "name": "Apple Watch Series 9",
+        "description": "Đồng hồ thông minh với tính năng sức khỏe tiên tiến và màn hình Always-On",
+        "price": 8999000,
+        "category": "Wearable",
+        "product_type": "watch",
+        "colors": ["#C0C0C0", "#222222", "#FFD700", "#CC0000"],
+        "stock": 75,
+        "featured": True
+    },
+]
+
+# category: (product_type, brands, lines, descriptions, price range in VND)
+_CATALOG = {
+    "Laptop": (
+        "laptop", ["Apple", "Dell", "ASUS", "Lenovo", "HP", "Acer", "MSI"],
+        ["Pro", "Air", "XPS", "ZenBook", "ThinkPad", "Spectre", "Swift", "Stealth"],
+        ["Laptop mỏng nhẹ, pin bền bỉ cả ngày làm việc",
+         "Laptop gaming với card đồ họa rời và màn hình tần số quét cao",
+         "Laptop doanh nhân bền bỉ, bàn phím thoải mái, bảo mật vân tay"],
+        (9_000_000, 60_000_000),
+    ),
+    "Smartphone": (
+        "phone", ["Apple", "Samsung", "Xiaomi", "OPPO", "vivo", "Google"],
+        ["Pro", "Ultra", "Plus", "Lite", "Note", "Pixel", "Reno"],
+        ["Điện thoại camera chuyên nghiệp, sạc nhanh và màn hình sắc nét",
+         "Điện thoại pin khủng, hiệu năng mạnh mẽ trong tầm giá",
+         "Điện thoại gập thời thượng với màn hình lớn linh hoạt"],
+        (3_000_000, 45_000_000),
+    ),
+    "Audio": (
+        "headphones", ["Apple", "Sony", "JBL", "Bose", "Sennheiser", "Marshall"],
+        ["Buds", "Studio", "WH", "QuietComfort", "Momentum", "Live"],
+        ["Tai nghe chống ồn chủ động, âm bass sâu và pin lâu",
+         "Tai nghe không dây nhỏ gọn, kết nối ổn định, chống nước",
+         "Tai nghe kiểm âm trung thực dành cho người sáng tạo nội dung"],
+        (500_000, 12_000_000),
+    ),
+    "Wearable": (
+        "watch", ["Apple", "Samsung", "Garmin", "Huawei", "Amazfit", "Xiaomi"],
+        ["Watch", "Fit", "Forerunner", "GT", "Band", "Active"],
+        ["Đồng hồ thông minh theo dõi sức khỏe, nhịp tim và giấc ngủ",
+         "Đồng hồ thể thao với GPS chính xác và pin nhiều ngày",
+         "Vòng đeo tay thông minh gọn nhẹ, thông báo tức thì"],
+        (800_000, 25_000_000),
+    ),
+}
+_COLORS = ["#C0C0C0", "#222222", "#FFD700", "#FFFFFF", "#0066CC", "#CC0000", "#2E8B57", "#FF69B4"]
+_FAMILY_NAMES = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ"]
+_MIDDLE_NAMES = ["Văn", "Thị", "Minh", "Thu", "Quốc", "Ngọc", "Hữu", "Thanh", "Gia", "Bảo"]
+_GIVEN_NAMES = ["An", "Bình", "Châu", "Dũng", "Hà", "Hải", "Hương", "Khoa", "Lan", "Linh", "Long",
+                "Mai", "Nam", "Phúc", "Quân", "Tâm", "Thảo", "Trang", "Tuấn", "Vy"]
+_STREETS = ["Lê Lợi", "Nguyễn Huệ", "Trần Hưng Đạo", "Hai Bà Trưng", "Lý Thường Kiệt", "Điện Biên Phủ"]
+_CITIES = ["TP. Hồ Chí Minh", "Hà Nội", "Đà Nẵng", "Cần Thơ", "Hải Phòng", "Nha Trang"]
+# Generated timestamps fall in the year after this, so reruns match
+_EPOCH = datetime(2024, 1, 1)
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _moment(rng: random.Random) -> datetime:
+    return _EPOCH + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+
+
+def generate_products(count: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Products with realistic names, prices and stock, in all four categories."""
+    rng = random.Random(f"products:{seed}")
+    categories = list(_CATALOG)
+    for i in range(count):
+        category = categories[i % len(categories)]
+        product_type, brands, lines, descriptions, (low, high) = _CATALOG[category]
+        brand, line = rng.choice(brands), rng.choice(lines)
+        created_at = _moment(rng)
+        product_id = _uuid(rng)
+        yield {
+            "id": product_id,
+            "name": f"{brand} {line} {rng.randint(1, 15)}{rng.choice(['', ' Pro', ' Max', ' SE', ' 5G'])}",
+            "description": f"{rng.choice(descriptions)}. Chính hãng {brand}, bảo hành 12 tháng.",
+            # Retail prices end in thousands
+            "price": float(rng.randrange(low, high, 10_000) - 10_000 + 9_000),
+            "category": category,
+            "product_type": product_type,
+            "colors": rng.sample(_COLORS, rng.randint(1, 4)),
+            "model_url": None,
+            "images": [f"https://cdn.example.com/products/{product_id}/{n}.jpg" for n in range(rng.randint(1, 4))],
+            "stock": 0 if rng.random() < 0.05 else rng.randint(1, 500),
+            "featured": rng.random() < 0.02,
+            "created_at": created_at,
+            "updated_at": created_at + timedelta(days=rng.randint(0, 30)),
+        }
+
+
+def generate_users(count: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    rng = random.Random(f"users:{seed}")
+    for i in range(count):
+        yield {
+            "id": _uuid(rng),
+            # The index keeps emails unique, so number them
+            "email": f"khachhang{seed}.{i}@example.vn",
+            "name": f"{rng.choice(_FAMILY_NAMES)} {rng.choice(_MIDDLE_NAMES)} {rng.choice(_GIVEN_NAMES)}",
+            "phone": f"+84 {rng.choice([3, 5, 7, 8, 9])}{rng.randrange(10 ** 7, 10 ** 8)}",
+            "address": f"{rng.randint(1, 500)} Đường {rng.choice(_STREETS)}, {rng.choice(_CITIES)}",
+            "created_at": _moment(rng),
+        }
+
+
+def generate_carts(count: int, products: int, users: int, seed: int = 0,
+                   expires_at: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """Carts holding lines of the first (up to 1000) of `products` generated
+    products, a third of them belonging to one of the first generated users.
+
+    Their lines hold no stock reservation, as after one expired; checkout
+    takes the stock then. `expires_at` should be in the future, or the
+    carts' TTL index removes them straight away.
+    """
+    # Regenerating the first ids is cheaper than keeping millions in memory
+    product_ids = [p["id"] for p in generate_products(min(products, 1000), seed)]
+    user_ids = [u["id"] for u in generate_users(min(users, 1000), seed)]
+    rng = random.Random(f"carts:{seed}")
+    for i in range(count):
+        updated_at = _moment(rng)
+        items = [
+            {
+                "id": _uuid(rng),
+                "product_id": rng.choice(product_ids),
+                "quantity": rng.randint(1, 3),
+                "selected_color": rng.choice(_COLORS),
+                "added_at": updated_at,
+            }
+            for _ in range(rng.randint(1, 4) if product_ids else 0)
+        ]
+        yield {
+            "id": _uuid(rng),
+            "user_id": rng.choice(user_ids) if user_ids and rng.random() < 0.33 else None,
+            "session_id": f"seed-session-{seed}-{i}",
+            "items": items,
+            "created_at": updated_at,
+            "updated_at": updated_at,
+            "expires_at": expires_at or datetime.utcnow() + timedelta(days=30),
+        }
+
+
+def _batches(documents: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def insert_stream(collection, documents: Iterable[dict], batch_size: int = 1000,
+                        concurrency: int = 4, enrich: Optional[Callable[[dict], dict]] = None) -> Dict[str, int]:
+    """Insert every document with unordered insert_many batches, `concurrency`
+    batches in flight; documents already present are counted, not inserted."""
+    report = {"inserted": 0, "existing": 0}
+    in_flight = asyncio.Semaphore(concurrency)
+    pending = set()
+
+    async def insert(batch):
+        try:
+            result = await collection.insert_many(batch, ordered=False)
+            report["inserted"] += len(result.inserted_ids)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            report["inserted"] += e.details.get("nInserted", 0)
+            report["existing"] += len(errors)
+        finally:
+            in_flight.release()
+
+    try:
+        for batch in _batches(documents, batch_size):
+            if enrich is not None:
+                batch = [{**document, **enrich(document)} for document in batch]
+            await in_flight.acquire()
+            task = asyncio.create_task(insert(batch))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            # Surface a failed batch instead of generating on regardless
+            for done in [t for t in pending if t.done()]:
+                done.result()
+        await asyncio.gather(*pending)
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        raise
+    return report
+
+
+async def seed(db, products: int = 0, users: int = 0, carts: int = 0, seed: int = 0,
+               batch_size: int = 1000, concurrency: int = 4,
+               enrich_product: Optional[Callable[[dict], dict]] = None,
+               cart_expires_at: Optional[datetime] = None) -> Dict[str, Dict[str, int]]:
+    """Generate and insert the given numbers of products, users and carts."""
+    options = {"batch_size": batch_size, "concurrency": concurrency}
+    return {
+        "products": await insert_stream(db.products, generate_products(products, seed),
+                                        enrich=enrich_product, **options),
+        "users": await insert_stream(db.users, generate_users(users, seed), **options),
+        "carts": await insert_stream(
+            db.carts, generate_carts(carts, products, users, seed, cart_expires_at), **options
+        ),
+    }
+
+
+async def claim_marker(db, name: str, collection) -> bool:
+    """Claim the right to seed `collection` as `name`; False if it holds
+    data already or another request claimed it first.
+
+    The emptiness check reads the count from collection metadata, O(1)
+    unlike count_documents. A claim stays after seeding, so deleting the
+    seeded data does not bring it back; delete the marker for that.
+    """
+    if await collection.estimated_document_count() > 0:
+        return False
+    try:
+        await db.seed_markers.insert_one({"id": name, "seeded_at": datetime.utcnow()})
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def release_marker(db, name: str) -> None:
+    """Forget a claim whose seeding failed, so it can be tried again."""
+    await db.seed_markers.delete_one({"id": name})
@@ -0,0 +1,48 @@
+"""Fast JSON encoding for documents read back from MongoDB.
+
+Everything in our collections was written from a validated model, so read
+paths can project exactly the model's fields and encode the raw documents
+without building a model per document (and FastAPI validating it again
+through response_model). Strict mode keeps the full validation round trip,
+which is what development should run with.
+"""
+import json
+from datetime import datetime
+from typing import Any, Dict, Type
+
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def projection(model: Type[BaseModel]) -> Dict[str, int]:
+    """Find projection returning only the model's fields, without `_id`."""
+    fields = {name: 1 for name in model.model_fields}
+    fields["_id"] = 0
+    return fields
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def encode(documents: Any, adapter: TypeAdapter, strict: bool = False) -> bytes:
+    """Encode one document or a list of them as the adapter's JSON.
+
+    With strict set the documents are validated through the adapter first,
+    exactly as response_model would.
+    """
+    if strict:
+        return adapter.dump_json(adapter.validate_python(documents))
+    return dumps(documents)
@@ -1,28 +1,204 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import List, Optional
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from admission import AdmissionMiddleware, Rate, RateLimiter, create_buckets
+from bulk_import import FORMATS, format_for_content_type, import_products, iter_lines, read_records
+from catalog_cache import CatalogCache, listing_key, product_key
+from checkout import CheckoutError, checkout
+from database import catalog_read_preference, client_options, prewarm_connections, prewarm_pool
+from events import CART_ADD, VIEW, EventBuffer
+from http_cache import cache_control, etag, http_date, not_modified
+from indexes import ensure_indexes
+from inventory import OutOfStock, available, held, release, reserve, sweep_expired
+from jobs import JobQueue, QueueFull
+from metrics import MetricsMiddleware, cache_collector, event_listeners, render_metrics
+from pagination import (
+    NDJSON_MEDIA_TYPE, NEXT_CURSOR_HEADER, InvalidCursor, SortKey,
+    encode_cursor, keyset_filter, ndjson_stream, next_cursor, through_filter, wants_ndjson,
+)
+from redis_cache import create_redis_cache
+from search import build_pipeline, format_result, search_text
+from seeding import SHOWCASE_PRODUCTS, claim_marker, generate_products, insert_stream, release_marker
+from serialization import dumps, encode, projection
+from singleflight import SingleFlight
+from trending import list_name, refresh_periodically, remove_product
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection, opened by the lifespan handler below; pool settings
+# come from the environment, see database.py
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+client: Optional[AsyncIOMotorClient] = None
+db = None
+# Same database, read from secondaries where allowed; only for catalog reads
+# that tolerate lag. Writes and read-after-write stay on `db` (primary).
+# A lagging read right after an invalidation may be cached for one cache
+# TTL; the max staleness bound limits how far behind it can be.
+catalog_db = None
+
+# In-process catalog cache; a TTL of 0 disables it
+catalog_cache = CatalogCache(
+    max_entries=int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', '1024')),
+    ttl_seconds=float(os.environ.get('CATALOG_CACHE_TTL_SECONDS', '30')),
+)
+
+# Shared Redis tier for products and carts, shared by all workers. When
+# REDIS_URL is set it replaces the in-process catalog cache; `memory://`
+# runs against an in-process fakeredis.
+redis_cache = create_redis_cache(
+    os.environ.get('REDIS_URL'),
+    ttl_seconds=int(os.environ.get('REDIS_CACHE_TTL_SECONDS', '60')),
+)
+
+# Identical concurrent product reads share one query and one rendering,
+# cached or not; see singleflight.py
+catalog_reads = SingleFlight()
+
+cache_collector.register("catalog", catalog_cache.stats)
+cache_collector.register("singleflight", catalog_reads.stats)
+if redis_cache is not None:
+    cache_collector.register("redis", redis_cache.stats)
+
+# Guest carts are removed by a TTL index once untouched for this long
+CART_RETENTION = timedelta(days=float(os.environ.get('CART_RETENTION_DAYS', '30')))
+
+# Stock added to a cart is held for the session this long after its last
+# add, then swept back into stock
+INVENTORY_HOLD = timedelta(minutes=float(os.environ.get('INVENTORY_HOLD_MINUTES', '15')))
+INVENTORY_SWEEP_INTERVAL = float(os.environ.get('INVENTORY_SWEEP_INTERVAL_SECONDS', '30'))
+
+# Product views and adds to cart are counted in memory and flushed in bulk,
+# see events.py; trending.py ranks them into precomputed lists
+product_events = EventBuffer(
+    max_keys=int(os.environ.get('EVENT_BUFFER_MAX_KEYS', '5000')),
+    retention=timedelta(days=float(os.environ.get('EVENT_RETENTION_DAYS', '8'))),
+)
+EVENT_FLUSH_INTERVAL = float(os.environ.get('EVENT_FLUSH_INTERVAL_SECONDS', '5'))
+TRENDING_REFRESH_INTERVAL = float(os.environ.get('TRENDING_REFRESH_INTERVAL_SECONDS', '300'))
+TRENDING_WINDOW = timedelta(hours=float(os.environ.get('TRENDING_WINDOW_HOURS', '72')))
+# Products kept per list, the most /products/trending returns
+TRENDING_SIZE = int(os.environ.get('TRENDING_SIZE', '24'))
+
+# Side effects run as background jobs, see jobs.py
+job_queue = JobQueue(
+    concurrency=int(os.environ.get('JOB_CONCURRENCY', '4')),
+    max_depth=int(os.environ.get('JOB_QUEUE_MAX_DEPTH', '10000')),
+    max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', '5')),
+    lease=timedelta(seconds=float(os.environ.get('JOB_LEASE_SECONDS', '60'))),
+)
+# Seconds running jobs get to finish on shutdown before they are left to
+# another worker
+JOB_SHUTDOWN_GRACE = float(os.environ.get('JOB_SHUTDOWN_GRACE_SECONDS', '10'))
+
+# Token buckets per route for every client address and cart session, see
+# admission.py. RATE_LIMIT_REDIS_URL shares them between workers (`memory://`
+# for fakeredis); unset, each worker enforces the limits on its own.
+rate_limiter = RateLimiter(
+    create_buckets(os.environ.get('RATE_LIMIT_REDIS_URL')),
+    session_rate=Rate(
+        float(os.environ.get('RATE_LIMIT_SESSION_PER_SECOND', '5')),
+        int(os.environ.get('RATE_LIMIT_SESSION_BURST', '30')),
+    ),
+    client_rate=Rate(
+        float(os.environ.get('RATE_LIMIT_CLIENT_PER_SECOND', '100')),
+        int(os.environ.get('RATE_LIMIT_CLIENT_BURST', '1000')),
+    ),
+    # Proxies in front of the app that append to X-Forwarded-For: 1 for the
+    # bundled nginx, one more for each ingress that appends too. Never more
+    # than actually exist, or clients can choose their own address.
+    trusted_proxies=int(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', '0')),
+    enabled=os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true',
+    exempt=("/api/health/live", "/api/health/ready"),
+)
+
+# API requests a worker serves at once (default: the MongoDB pool size, or
+# the driver's 100), and how many more may wait how long for a turn before
+# being refused with 503
+ADMISSION_MAX_CONCURRENCY = int(
+    os.environ.get('ADMISSION_MAX_CONCURRENCY') or client_options().get('maxPoolSize', 100)
+)
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', '500'))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_SECONDS', '2'))
+
+# Largest page a listing returns; a larger `limit` is rejected with 422
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '100'))
+# Most items one NDJSON stream returns; its X-Next-Cursor resumes after them
+MAX_STREAM_SIZE = int(os.environ.get('MAX_STREAM_SIZE', '10000'))
+
+# Generated products /init-sample-data may add in one request
+SAMPLE_DATA_MAX_PRODUCTS = int(os.environ.get('SAMPLE_DATA_MAX_PRODUCTS', '10000'))
+
+# Validate every document through its model before responding instead of
+# encoding trusted database reads directly; turn on in development.
+STRICT_RESPONSE_VALIDATION = os.environ.get('STRICT_RESPONSE_VALIDATION', 'false').lower() == 'true'
+
+# Cache-Control for catalog reads. Browsers revalidate every time by default,
+# which the ETag turns into a bodyless 304; shared caches (nginx) may reuse
+# a response for the shared max age without asking.
+HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE_SECONDS', '0'))
+HTTP_CACHE_SHARED_MAX_AGE = int(os.environ.get('HTTP_CACHE_SHARED_MAX_AGE_SECONDS', '30'))
+
+# Seconds the readiness probe waits for MongoDB to answer a ping
+READINESS_TIMEOUT = float(os.environ.get('READINESS_TIMEOUT_SECONDS', '2'))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db, catalog_db
+    options = client_options()
+    client = AsyncIOMotorClient(mongo_url, event_listeners=event_listeners(), **options)
+    db = client[os.environ['DB_NAME']]
+    catalog_db = db.with_options(read_preference=catalog_read_preference())
+    catalog_watch = inventory_sweeper = event_flusher = trending_refresher = None
+    try:
+        await prewarm_pool(client, prewarm_connections(options))
+        await bootstrap_indexes()
+        catalog_watch = start_catalog_watch()
+        inventory_sweeper = asyncio.create_task(sweep_expired(db, INVENTORY_SWEEP_INTERVAL))
+        event_flusher = asyncio.create_task(
+            product_events.flush_periodically(db.product_events, EVENT_FLUSH_INTERVAL)
+        )
+        trending_refresher = asyncio.create_task(refresh_periodically(
+            db, TRENDING_REFRESH_INTERVAL, fields=PRODUCT_FIELDS, window=TRENDING_WINDOW, size=TRENDING_SIZE,
+        ))
+        job_queue.start(db.jobs)
+        app.state.ready = True
+        yield
+    finally:
+        app.state.ready = False
+        await job_queue.stop(JOB_SHUTDOWN_GRACE)
+        for task in (catalog_watch, inventory_sweeper, event_flusher, trending_refresher):
+            if task:
+                task.cancel()
+        if event_flusher:
+            try:
+                await product_events.flush(db.product_events)
+            except PyMongoError:
+                logger.exception("Could not flush product events on shutdown")
+        if redis_cache is not None:
+            await redis_cache.close()
+        await rate_limiter.buckets.close()
+        client.close()
 
 # Create the main app without a prefix
-app = FastAPI(title="3D Tech Store API", version="1.0.0")
+app = FastAPI(title="3D Tech Store API", version="1.0.0", lifespan=lifespan)
 
-# Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+# Create a router with the /api prefix; every route is rate limited
+api_router = APIRouter(prefix="/api", dependencies=[Depends(rate_limiter)])
 
 # Product Models
 class Product(BaseModel):
@@ -72,18 +248,67 @@ class CartItem(BaseModel):
     selected_color: str
     added_at: datetime = Field(default_factory=datetime.utcnow)
 
+def cart_id(session_id: str) -> str:
+    """A session's cart id, the same before the cart is stored and after"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"urn:cart:{session_id}"))
+
 class Cart(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: Optional[str] = None  # For guest users, this can be None
     session_id: str  # To track guest carts
     items: List[CartItem] = []
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # None for an empty cart that has not been stored yet
+    created_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
 
 class CartItemAdd(BaseModel):
     product_id: str
-    quantity: int = 1
+    quantity: int = Field(1, ge=1)
+    selected_color: str
+
+# Cart lines joined with the product details needed to render them
+class CartLineView(BaseModel):
+    id: str
+    product_id: str
+    quantity: int
     selected_color: str
+    added_at: datetime
+    available: bool  # False once the product has been deleted
+    name: Optional[str] = None
+    product_type: Optional[str] = None
+    price: Optional[float] = None
+    image: Optional[str] = None
+    stock: Optional[int] = None
+    line_total: float = 0
+
+class CartView(BaseModel):
+    id: str
+    session_id: str
+    user_id: Optional[str] = None
+    items: List[CartLineView] = []
+    item_count: int = 0
+    subtotal: float = 0
+    updated_at: Optional[datetime] = None
+
+# Order Models
+class OrderLine(BaseModel):
+    product_id: str
+    name: str
+    price: float  # at the time of checkout
+    quantity: int
+    selected_color: str
+    line_total: float
+
+class Order(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    session_id: str
+    user_id: Optional[str] = None
+    items: List[OrderLine]
+    subtotal: float
+    status: str = "placed"  # "confirmed" once the order_placed job ran
+    idempotency_key: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    confirmed_at: Optional[datetime] = None
 
 # User Models
 class User(BaseModel):
@@ -109,11 +334,93 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+# Read paths project these fields and encode the documents directly,
+# see serialization.py; the adapters are used in strict mode.
+PRODUCT_FIELDS = projection(Product)
+CART_FIELDS = projection(Cart)
+ORDER_FIELDS = projection(Order)
+USER_FIELDS = projection(User)
+STATUS_CHECK_FIELDS = projection(StatusCheck)
+product_list_adapter = TypeAdapter(List[Product])
+product_adapter = TypeAdapter(Product)
+cart_adapter = TypeAdapter(Cart)
+cart_view_adapter = TypeAdapter(CartView)
+order_adapter = TypeAdapter(Order)
+user_adapter = TypeAdapter(User)
+status_check_list_adapter = TypeAdapter(List[StatusCheck])
+status_check_adapter = TypeAdapter(StatusCheck)
+
+def render(documents, adapter: TypeAdapter) -> bytes:
+    return encode(documents, adapter, strict=STRICT_RESPONSE_VALIDATION)
+
+def json_response(content: bytes) -> Response:
+    return Response(content=content, media_type="application/json")
+
+def cacheable_response(
+    request: Request, content: bytes, last_modified: Optional[datetime] = None, headers: Optional[dict] = None
+) -> Response:
+    """JSON response with validators, or a 304 if the client's copy is current"""
+    headers = {
+        **(headers or {}),
+        "ETag": etag(content),
+        "Cache-Control": cache_control(HTTP_CACHE_MAX_AGE, HTTP_CACHE_SHARED_MAX_AGE),
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    if not_modified(request.headers, headers["ETag"], last_modified):
+        return Response(status_code=304, headers=headers)
+    response = json_response(content)
+    response.headers.update(headers)
+    return response
+
+async def ndjson_response(collection, query: dict, fields: dict, sort_keys, adapter: TypeAdapter) -> StreamingResponse:
+    """Stream at most MAX_STREAM_SIZE matches of query in sort order"""
+    sort = [(key.field, 1) for key in sort_keys]
+    # The last document of the stream, read from the index before it starts
+    keys = {"_id": 0, **{key.field: 1 for key in sort_keys}}
+    last = await collection.find(query, keys).sort(sort).skip(MAX_STREAM_SIZE - 1).limit(1).to_list(1)
+    headers = {}
+    if last:
+        query = through_filter(query, sort_keys, last[0])
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(last[0], sort_keys)
+    return StreamingResponse(
+        ndjson_stream(collection.find(query, fields).sort(sort), lambda document: render(document, adapter)),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers=headers,
+    )
+
+def paginated_query(filter_dict: dict, sort_fields, cursor: Optional[str]) -> dict:
+    try:
+        return keyset_filter(filter_dict, sort_fields, cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Keyset pagination sort orders, each backed by an index
+PRODUCT_SORT = (SortKey("id", str),)
+STATUS_CHECK_SORT = (SortKey("timestamp", datetime), SortKey("id", str))
+
 # Root endpoint
 @api_router.get("/")
 async def root():
     return {"message": "3D Tech Store API - Ready to serve!", "version": "1.0.0"}
 
+# Health checks
+@api_router.get("/health/live")
+async def liveness():
+    """The process is up"""
+    return {"status": "ok"}
+
+@api_router.get("/health/ready")
+async def readiness():
+    """Ready once startup has finished and MongoDB answers"""
+    if not getattr(app.state, 'ready', False):
+        raise HTTPException(status_code=503, detail="Starting up or shutting down")
+    try:
+        await asyncio.wait_for(client.admin.command('ping'), READINESS_TIMEOUT)
+    except (PyMongoError, asyncio.TimeoutError):
+        raise HTTPException(status_code=503, detail="MongoDB unavailable")
+    return {"status": "ready"}
+
 # Status check endpoints
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
@@ -123,19 +430,71 @@ async def create_status_check(input: StatusCheckCreate):
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+async def get_status_checks(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Get status checks oldest first, one page at a time.
+    
+    The next page's cursor is returned in the X-Next-Cursor header. With
+    `Accept: application/x-ndjson` up to MAX_STREAM_SIZE checks after the
+    cursor are streamed instead of `limit`.
+    """
+    query = paginated_query({}, STATUS_CHECK_SORT, cursor)
+    if wants_ndjson(request.headers.get("accept")):
+        return await ndjson_response(
+            db.status_checks, query, STATUS_CHECK_FIELDS, STATUS_CHECK_SORT, status_check_adapter
+        )
+    
+    find = db.status_checks.find(query, STATUS_CHECK_FIELDS).sort([(key.field, 1) for key in STATUS_CHECK_SORT])
+    status_checks = await find.limit(limit).to_list(limit)
+    page = json_response(render(status_checks, status_check_list_adapter))
+    page_cursor = next_cursor(status_checks, limit, STATUS_CHECK_SORT)
+    if page_cursor:
+        page.headers[NEXT_CURSOR_HEADER] = page_cursor
+    return page
+
+async def invalidate_products():
+    catalog_reads.forget()
+    if redis_cache is not None:
+        await redis_cache.invalidate("products")
+
+async def invalidate_cart(session_id: str):
+    if redis_cache is not None:
+        await redis_cache.invalidate(f"cart:{session_id}")
+
+def search_fields(product: dict) -> dict:
+    """Derived fields stored alongside a product for /products/search"""
+    return {"search_text": search_text(product)}
+
+def product_document(product: Product) -> dict:
+    return {**product.dict(), **search_fields(product.dict())}
+
+async def catalog_find_one(collection: str, query: dict, fields: dict):
+    # A miss on a lagging secondary is re-checked on the primary, so a
+    # document created moments ago is never reported missing
+    document = await catalog_db[collection].find_one(query, fields)
+    if document is None and catalog_db.read_preference != db.read_preference:
+        document = await db[collection].find_one(query, fields)
+    return document
 
 # Product endpoints
 @api_router.get("/products", response_model=List[Product])
 async def get_products(
+    request: Request,
     category: Optional[str] = None,
     product_type: Optional[str] = None,
     featured: Optional[bool] = None,
-    limit: int = 50
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
 ):
-    """Get all products with optional filtering"""
+    """Get products with optional filtering, one page at a time.
+    
+    The next page's cursor is returned in the X-Next-Cursor header. With
+    `Accept: application/x-ndjson` up to MAX_STREAM_SIZE matches after the
+    cursor are streamed instead of `limit`.
+    """
     filter_dict = {}
     if category:
         filter_dict["category"] = category
@@ -144,38 +503,201 @@ async def get_products(
     if featured is not None:
         filter_dict["featured"] = featured
     
-    products = await db.products.find(filter_dict).limit(limit).to_list(limit)
-    return [Product(**product) for product in products]
+    query = paginated_query(filter_dict, PRODUCT_SORT, cursor)
+    sort = [(key.field, 1) for key in PRODUCT_SORT]
+    if wants_ndjson(request.headers.get("accept")):
+        return await ndjson_response(catalog_db.products, query, PRODUCT_FIELDS, PRODUCT_SORT, product_adapter)
+    
+    async def load():
+        return await catalog_db.products.find(query, PRODUCT_FIELDS).sort(sort).limit(limit).to_list(limit)
+    
+    async def read_page():
+        if redis_cache is not None:
+            # Cached as "<next cursor>\n<JSON body>" so hits can set the header too
+            async def load_json():
+                products = await load()
+                page_cursor = next_cursor(products, limit, PRODUCT_SORT) or ""
+                return page_cursor.encode() + b"\n" + render(products, product_list_adapter)
+            key = "list:" + "&".join(f"{k}={v}" for k, v in sorted(filter_dict.items())) + f":{limit}:{cursor or ''}"
+            page_cursor, content = (await redis_cache.get_or_load("products", key, load_json)).split(b"\n", 1)
+            return page_cursor.decode(), content
+        products = await catalog_cache.get_or_load(listing_key(filter_dict, limit, cursor), load)
+        return next_cursor(products, limit, PRODUCT_SORT), render(products, product_list_adapter)
+    
+    page_cursor, content = await catalog_reads.run(listing_key(filter_dict, limit, cursor), read_page)
+    
+    # The same URL streams NDJSON when asked to
+    headers = {"Vary": "Accept"}
+    if page_cursor:
+        headers[NEXT_CURSOR_HEADER] = page_cursor
+    return cacheable_response(request, content, headers=headers)
+
+@api_router.get("/products/search")
+async def search_products(
+    request: Request,
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    product_type: Optional[str] = None,
+    color: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Search products by text, returning matches and facet counts.
+    
+    `q` ignores case and Vietnamese diacritics. Facets (category,
+    product_type, color and price buckets) count everything matching the
+    query and filters, and come back in the same round trip.
+    """
+    pipeline = build_pipeline(
+        PRODUCT_FIELDS, q=q, category=category, product_type=product_type,
+        color=color, min_price=min_price, max_price=max_price, limit=limit,
+    )
+    facet_output = await catalog_db.products.aggregate(pipeline).to_list(1)
+    return cacheable_response(request, dumps(format_result(facet_output[0])))
+
+@api_router.get("/products/trending", response_model=List[Product])
+async def get_trending_products(
+    request: Request,
+    category: Optional[str] = None,
+    limit: int = Query(8, ge=1, le=TRENDING_SIZE)
+):
+    """Get the most viewed and added to cart products lately, overall or in a category"""
+    # Precomputed by trending.refresh; one read by the unique id index
+    merchandised = await catalog_db.merchandising.find_one(
+        {"id": list_name(category)}, {"_id": 0, "products": {"$slice": limit}, "computed_at": 1}
+    )
+    if not merchandised:
+        # Not computed yet (fresh deployment); featured products meanwhile
+        query = {"featured": True, **({"category": category} if category else {})}
+        products = await catalog_db.products.find(query, PRODUCT_FIELDS).sort("id", 1).limit(limit).to_list(limit)
+        return cacheable_response(request, render(products, product_list_adapter))
+    return cacheable_response(
+        request, render(merchandised["products"], product_list_adapter),
+        last_modified=merchandised["computed_at"],
+    )
 
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
+async def get_product(product_id: str, request: Request):
     """Get a specific product by ID"""
-    product = await db.products.find_one({"id": product_id})
+    async def load():
+        return await catalog_find_one("products", {"id": product_id}, PRODUCT_FIELDS)
+    
+    async def read_product():
+        if redis_cache is not None:
+            # Cached as "<updated_at>\n<JSON body>" so hits need not parse the body
+            async def load_json():
+                product = await load()
+                if product is None:
+                    return None
+                return product["updated_at"].isoformat().encode() + b"\n" + render(product, product_adapter)
+            cached = await redis_cache.get_or_load("products", f"item:{product_id}", load_json)
+            if cached is None:
+                return None, None
+            updated_at, content = cached.split(b"\n", 1)
+            return content, datetime.fromisoformat(updated_at.decode())
+        product = await catalog_cache.get_or_load(product_key(product_id), load)
+        if product is None:
+            return None, None
+        return render(product, product_adapter), product["updated_at"]
+    
+    content, updated_at = await catalog_reads.run(product_key(product_id), read_product)
+    
+    if content is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return cacheable_response(request, content, last_modified=updated_at)
+
+@api_router.get("/products/{product_id}/stock")
+async def get_product_stock(product_id: str):
+    """Get the live stock of a product, bypassing every cache"""
+    # Product responses may be cached for a while; stock moves with every
+    # reservation, so this is read from the primary and never cached
+    product = await db.products.find_one({"id": product_id}, {"_id": 0, "id": 1, "stock": 1})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return Product(**product)
+    return JSONResponse(product, headers={"Cache-Control": "no-store"})
+
+@api_router.post("/products/{product_id}/views", status_code=202)
+async def record_product_view(product_id: str):
+    """Count a view of a product page; written in bulk later"""
+    product_events.record(product_id, VIEW)
+    return Response(status_code=202)
 
 @api_router.post("/products", response_model=Product)
 async def create_product(product_data: ProductCreate):
     """Create a new product"""
     product = Product(**product_data.dict())
-    await db.products.insert_one(product.dict())
+    await db.products.insert_one(product_document(product))
+    catalog_cache.invalidate_product(product.id, product.dict())
+    await invalidate_products()
     return product
 
+@api_router.post("/products/bulk")
+async def bulk_import_products(
+    request: Request,
+    format: Optional[str] = None,
+    batch_size: int = Query(500, ge=1, le=10000),
+    concurrency: int = Query(1, ge=1, le=16)
+):
+    """Create or update products in bulk from a CSV, JSON or NDJSON body.
+    
+    The format comes from the Content-Type unless given explicitly. Rows with
+    an `id` upsert that product. Invalid rows are reported per row and do not
+    stop the import; a body that cannot be read to the end does, with a 400
+    carrying the report of the rows before that point and the `error`.
+    """
+    fmt = format or format_for_content_type(request.headers.get("content-type"))
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=415, detail=f"Expected one of: {', '.join(FORMATS)}")
+    
+    records = read_records(iter_lines(request.stream()), fmt)
+    try:
+        report = await import_products(
+            db.products, records, ProductCreate, Product,
+            batch_size=batch_size, concurrency=concurrency, enrich=search_fields,
+            reservations=db.reservations,
+        )
+    finally:
+        catalog_cache.clear()
+        await invalidate_products()
+    if "error" in report:
+        return JSONResponse(report, status_code=400)
+    return report
+
 @api_router.put("/products/{product_id}", response_model=Product)
 async def update_product(product_id: str, product_data: ProductUpdate):
     """Update an existing product"""
-    existing_product = await db.products.find_one({"id": product_id})
-    if not existing_product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
     update_data = {k: v for k, v in product_data.dict().items() if v is not None}
     update_data["updated_at"] = datetime.utcnow()
+    if "name" in update_data and "description" in update_data:
+        update_data["search_text"] = search_text(update_data)
+    if "stock" in update_data:
+        # The units on hand; those held in carts are already spoken for
+        holds = await held(db.reservations, [product_id])
+        update_data["stock"] = available(update_data["stock"], holds.get(product_id, 0))
+    
+    # One round trip: the update itself tells us whether the product exists
+    updated_product = await db.products.find_one_and_update(
+        {"id": product_id},
+        {"$set": update_data},
+        projection=PRODUCT_FIELDS,
+        return_document=ReturnDocument.AFTER,
+    )
+    if updated_product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
     
-    await db.products.update_one({"id": product_id}, {"$set": update_data})
+    if ("name" in update_data) != ("description" in update_data):
+        # search_text folds both fields and only one was sent. Conditioned
+        # on the values it was computed from, so it never overwrites the
+        # search_text of a later rename.
+        await db.products.update_one(
+            {"id": product_id, "name": updated_product["name"], "description": updated_product["description"]},
+            {"$set": {"search_text": search_text(updated_product)}},
+        )
     
-    updated_product = await db.products.find_one({"id": product_id})
-    return Product(**updated_product)
+    catalog_cache.invalidate_product(product_id, updated_product)
+    await invalidate_products()
+    return json_response(render(updated_product, product_adapter))
 
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str):
@@ -183,184 +705,345 @@ async def delete_product(product_id: str):
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    catalog_cache.invalidate_product(product_id)
+    await invalidate_products()
+    try:
+        await job_queue.enqueue("product_deleted", {"product_id": product_id})
+    except QueueFull:
+        await remove_product(db, product_id)
     return {"message": "Product deleted successfully"}
 
 # Cart endpoints
 @api_router.get("/cart/{session_id}", response_model=Cart)
 async def get_cart(session_id: str):
     """Get cart by session ID"""
-    cart = await db.carts.find_one({"session_id": session_id})
-    if not cart:
-        # Create new cart for session
-        new_cart = Cart(session_id=session_id)
-        await db.carts.insert_one(new_cart.dict())
-        return new_cart
-    return Cart(**cart)
+    async def load_json():
+        cart = await db.carts.find_one({"session_id": session_id}, CART_FIELDS)
+        if not cart:
+            # Empty carts are not stored; the first add_to_cart creates it.
+            # Until then the response is the same on every request.
+            cart = Cart(id=cart_id(session_id), session_id=session_id, created_at=None, updated_at=None).dict()
+        return render(cart, cart_adapter)
+    
+    if redis_cache is not None:
+        return json_response(await redis_cache.get_or_load(f"cart:{session_id}", "cart", load_json))
+    return json_response(await load_json())
+
+def cart_touch(now: datetime) -> dict:
+    """Fields every cart write sets, pushing back the cart's expiry"""
+    return {"updated_at": now, "expires_at": now + CART_RETENTION}
+
+# Rounds of $inc-then-upsert add_to_cart tries while concurrent requests keep
+# adding and removing the same line
+CART_ADD_ATTEMPTS = 3
+
+async def _increment_cart_item(session_id: str, item_data: CartItemAdd, now: datetime):
+    """Bump the quantity of an existing line in place; None if there is no such line"""
+    return await db.carts.find_one_and_update(
+        {
+            "session_id": session_id,
+            "items": {"$elemMatch": {
+                "product_id": item_data.product_id,
+                "selected_color": item_data.selected_color,
+            }},
+        },
+        {"$inc": {"items.$.quantity": item_data.quantity}, "$set": cart_touch(now)},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def _push_cart_item(session_id: str, item_data: CartItemAdd, now: datetime):
+    """Append a new line, creating the cart if the session has none"""
+    new_item = CartItem(**item_data.dict(), added_at=now)
+    return await db.carts.find_one_and_update(
+        {
+            "session_id": session_id,
+            "items": {"$not": {"$elemMatch": {
+                "product_id": item_data.product_id,
+                "selected_color": item_data.selected_color,
+            }}},
+        },
+        {
+            "$push": {"items": new_item.dict()},
+            "$set": cart_touch(now),
+            "$setOnInsert": {"id": cart_id(session_id), "user_id": None, "created_at": now},
+        },
+        projection={"_id": 0},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
 
 @api_router.post("/cart/{session_id}/items")
 async def add_to_cart(session_id: str, item_data: CartItemAdd):
     """Add item to cart"""
-    # Check if product exists
-    product = await db.products.find_one({"id": item_data.product_id})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
+    try:
+        await reserve(db, session_id, item_data.product_id, item_data.quantity, INVENTORY_HOLD)
+    except OutOfStock:
+        # Only now tell a missing product apart from a sold out one
+        if not await db.products.find_one({"id": item_data.product_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Product not found")
+        raise HTTPException(status_code=409, detail="Not enough stock")
     
-    # Get or create cart
-    cart = await db.carts.find_one({"session_id": session_id})
-    if not cart:
-        cart = Cart(session_id=session_id)
-        await db.carts.insert_one(cart.dict())
-    else:
-        cart = Cart(**cart)
-    
-    # Check if item already exists in cart
-    existing_item = None
-    for item in cart.items:
-        if (item.product_id == item_data.product_id and 
-            item.selected_color == item_data.selected_color):
-            existing_item = item
-            break
+    # Each write below is a single atomic round trip, so concurrent adds
+    # from several tabs can no longer overwrite each other's items.
+    now = datetime.utcnow()
+    try:
+        cart = None
+        for _ in range(CART_ADD_ATTEMPTS):
+            cart = await _increment_cart_item(session_id, item_data, now)
+            if cart is not None:
+                break
+            try:
+                cart = await _push_cart_item(session_id, item_data, now)
+                break
+            except DuplicateKeyError:
+                # The line was added by a concurrent request after our $inc
+                # missed, so the upsert collided with the existing cart; a
+                # concurrent remove or clear may take it away again before
+                # the next $inc, hence the loop.
+                continue
+        if cart is None:
+            raise HTTPException(status_code=409, detail="Cart is being changed concurrently, try again")
+        response = {"message": "Item added to cart successfully", "cart": Cart(**cart)}
+    except BaseException:
+        await release(db, session_id, item_data.product_id, item_data.quantity)
+        raise
+    await invalidate_cart(session_id)
+    product_events.record(item_data.product_id, CART_ADD, item_data.quantity)
     
-    if existing_item:
-        # Update quantity
-        existing_item.quantity += item_data.quantity
-    else:
-        # Add new item
-        new_item = CartItem(**item_data.dict())
-        cart.items.append(new_item)
-    
-    cart.updated_at = datetime.utcnow()
-    await db.carts.update_one(
-        {"session_id": session_id}, 
-        {"$set": cart.dict()}
-    )
-    
-    return {"message": "Item added to cart successfully", "cart": cart}
+    return response
+
+async def _cart_exists(session_id: str) -> bool:
+    return await db.carts.find_one({"session_id": session_id}, {"_id": 1}) is not None
 
 @api_router.delete("/cart/{session_id}/items/{item_id}")
 async def remove_from_cart(session_id: str, item_id: str):
     """Remove item from cart"""
-    cart = await db.carts.find_one({"session_id": session_id})
-    if not cart:
-        raise HTTPException(status_code=404, detail="Cart not found")
-    
-    cart = Cart(**cart)
-    cart.items = [item for item in cart.items if item.id != item_id]
-    cart.updated_at = datetime.utcnow()
-    
-    await db.carts.update_one(
-        {"session_id": session_id}, 
-        {"$set": cart.dict()}
+    # The removed line comes back, so its reserved stock can be released
+    cart = await db.carts.find_one_and_update(
+        {"session_id": session_id, "items.id": item_id},
+        {"$pull": {"items": {"id": item_id}}, "$set": cart_touch(datetime.utcnow())},
+        projection={"_id": 0, "items": 1},
+        return_document=ReturnDocument.BEFORE,
     )
+    if cart is None:
+        if not await _cart_exists(session_id):
+            raise HTTPException(status_code=404, detail="Cart not found")
+    else:
+        line = next(line for line in cart["items"] if line["id"] == item_id)
+        await release(db, session_id, line["product_id"], line["quantity"])
+    await invalidate_cart(session_id)
     
     return {"message": "Item removed from cart successfully"}
 
 @api_router.delete("/cart/{session_id}")
 async def clear_cart(session_id: str):
     """Clear all items from cart"""
-    await db.carts.update_one(
+    cart = await db.carts.find_one_and_update(
         {"session_id": session_id}, 
-        {"$set": {"items": [], "updated_at": datetime.utcnow()}}
+        {"$set": {"items": [], **cart_touch(datetime.utcnow())}},
+        projection={"_id": 0, "items": 1},
+        return_document=ReturnDocument.BEFORE,
     )
+    if cart:
+        product_ids = {line["product_id"] for line in cart["items"]}
+        await asyncio.gather(*(release(db, session_id, product_id) for product_id in product_ids))
+    await invalidate_cart(session_id)
     return {"message": "Cart cleared successfully"}
 
+# Product fields a cart view needs from each line's product
+CART_VIEW_PRODUCT_FIELDS = {"id": 1, "name": 1, "product_type": 1, "price": 1, "images": 1, "stock": 1}
+
+@api_router.get("/cart/{session_id}/view", response_model=CartView)
+async def get_cart_view(session_id: str):
+    """Get cart with each line's product details, line totals and subtotal"""
+    # One round trip: $lookup resolves every line's product through the
+    # products.id index instead of the client fetching them one by one.
+    pipeline = [
+        {"$match": {"session_id": session_id}},
+        {"$lookup": {
+            "from": "products",
+            "localField": "items.product_id",
+            "foreignField": "id",
+            "as": "products",
+        }},
+        {"$project": {
+            "_id": 0,
+            **{field: 1 for field in CART_FIELDS if field != "_id"},
+            **{f"products.{field}": 1 for field in CART_VIEW_PRODUCT_FIELDS},
+        }},
+    ]
+    carts = await db.carts.aggregate(pipeline).to_list(1)
+    cart = carts[0] if carts else {"id": cart_id(session_id), "session_id": session_id, "items": [], "products": []}
+    
+    products = {product["id"]: product for product in cart["products"]}
+    lines = []
+    for item in cart["items"]:
+        product = products.get(item["product_id"], {})
+        price = product.get("price")
+        lines.append({
+            "id": item["id"],
+            "product_id": item["product_id"],
+            "quantity": item["quantity"],
+            "selected_color": item["selected_color"],
+            "added_at": item["added_at"],
+            "available": bool(product),
+            "name": product.get("name"),
+            "product_type": product.get("product_type"),
+            "price": price,
+            "image": product["images"][0] if product.get("images") else None,
+            "stock": product.get("stock"),
+            "line_total": price * item["quantity"] if price is not None else 0.0,
+        })
+    
+    view = {
+        "id": cart["id"],
+        "session_id": cart["session_id"],
+        "user_id": cart.get("user_id"),
+        "items": lines,
+        "item_count": sum(line["quantity"] for line in lines),
+        "subtotal": sum((line["line_total"] for line in lines), 0.0),
+        "updated_at": cart.get("updated_at"),
+    }
+    return json_response(render(view, cart_view_adapter))
+
+# Order endpoints
+@api_router.post("/cart/{session_id}/checkout", response_model=Order)
+async def checkout_cart(session_id: str, request: Request):
+    """Place an order for the cart; retries with the same Idempotency-Key
+    return the order already placed"""
+    async def confirm_later(order: dict, session):
+        # Committed with the order, so every order gets confirmed exactly once
+        await job_queue.enqueue("order_placed", {"order_id": order["id"]}, session=session, essential=True)
+    
+    try:
+        order = await checkout(
+            client, db, session_id, request.headers.get("idempotency-key"), cart_touch, confirm_later
+        )
+    except CheckoutError as e:
+        raise HTTPException(status_code=409 if e.product_id else 400, detail=str(e))
+    except PyMongoError as e:
+        if not e.has_error_label("TransientTransactionError"):
+            raise
+        # Still conflicting after every retry; the client retries with the same key
+        raise HTTPException(
+            status_code=503, detail="Checkout is busy, try again", headers={"Retry-After": "1"}
+        )
+    job_queue.wake()
+    await invalidate_cart(session_id)
+    return json_response(render(order, order_adapter))
+
+@api_router.get("/orders/{order_id}", response_model=Order)
+async def get_order(order_id: str):
+    """Get order by ID"""
+    order = await db.orders.find_one({"id": order_id}, ORDER_FIELDS)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return json_response(render(order, order_adapter))
+
+# Background jobs; each may run more than once, see jobs.py
+@job_queue.handler("order_placed")
+async def confirm_order(payload: dict):
+    # Where confirmation emails and fulfilment hand-off go
+    result = await db.orders.update_one(
+        {"id": payload["order_id"], "status": "placed"},
+        {"$set": {"status": "confirmed", "confirmed_at": datetime.utcnow()}},
+    )
+    if result.modified_count:
+        logger.info("Confirmed order %s", payload["order_id"])
+
+@job_queue.handler("product_deleted")
+async def forget_deleted_product(payload: dict):
+    await remove_product(db, payload["product_id"])
+
 # User endpoints
 @api_router.post("/users", response_model=User)
 async def create_user(user_data: UserCreate):
     """Create a new user"""
-    # Check if user with email already exists
-    existing_user = await db.users.find_one({"email": user_data.email})
-    if existing_user:
-        raise HTTPException(status_code=400, detail="User with this email already exists")
-    
     user = User(**user_data.dict())
-    await db.users.insert_one(user.dict())
+    try:
+        # The unique email index rejects duplicates, so no lookup beforehand
+        await db.users.insert_one(user.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="User with this email already exists")
     return user
 
 @api_router.get("/users/{user_id}", response_model=User)
 async def get_user(user_id: str):
     """Get user by ID"""
-    user = await db.users.find_one({"id": user_id})
+    user = await catalog_find_one("users", {"id": user_id}, USER_FIELDS)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return User(**user)
+    return json_response(render(user, user_adapter))
+
+# Cache statistics
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Get cache hit/miss/eviction counters"""
+    stats = {"catalog": catalog_cache.stats(), "singleflight": catalog_reads.stats()}
+    if redis_cache is not None:
+        stats["redis"] = redis_cache.stats()
+    return stats
 
 # Initialize sample data
 @api_router.post("/init-sample-data")
-async def initialize_sample_data():
-    """Initialize the database with sample products"""
-    
-    # Check if products already exist
-    existing_products = await db.products.count_documents({})
-    if existing_products > 0:
+async def initialize_sample_data(
+    products: int = Query(0, ge=0, le=SAMPLE_DATA_MAX_PRODUCTS),
+    seed: int = 0
+):
+    """Initialize an empty catalog with the showcase products, plus
+    `products` generated ones; larger volumes go through scripts/seed.py"""
+    if not await claim_marker(db, "sample-data", db.products):
         return {"message": "Sample data already exists"}
     
-    sample_products = [
-        {
-            "name": "MacBook Pro M3",
-            "description": "Laptop cao cấp với chip M3 mạnh mẽ, màn hình Retina 14 inch tuyệt đẹp",
-            "price": 29999000,
-            "category": "Laptop",
-            "product_type": "laptop",
-            "colors": ["#C0C0C0", "#222222", "#FFD700"],
-            "stock": 25,
-            "featured": True
-        },
-        {
-            "name": "iPhone 15 Pro",
-            "description": "Smartphone flagship với camera Pro, chip A17 Pro và thiết kế titanium",
-            "price": 26999000,
-            "category": "Smartphone",
-            "product_type": "phone",
-            "colors": ["#C0C0C0", "#222222", "#0066CC", "#FFD700"],
-            "stock": 50,
-            "featured": True
-        },
-        {
-            "name": "AirPods Pro (2nd Gen)",
-            "description": "Tai nghe không dây cao cấp với chống ồn chủ động và âm thanh không gian",
-            "price": 5999000,
-            "category": "Audio",
-            "product_type": "headphones",
-            "colors": ["#FFFFFF", "#222222"],
-            "stock": 100,
-            "featured": True
-        },
-        {
-            "name": "Apple Watch Series 9",
-            "description": "Đồng hồ thông minh với tính năng sức khỏe tiên tiến và màn hình Always-On",
-            "price": 8999000,
-            "category": "Wearable",
-            "product_type": "watch",
-            "colors": ["#C0C0C0", "#222222", "#FFD700", "#CC0000"],
-            "stock": 75,
-            "featured": True
-        }
-    ]
-    
-    products_to_insert = []
-    for product_data in sample_products:
-        product = Product(**product_data)
-        products_to_insert.append(product.dict())
-    
-    await db.products.insert_many(products_to_insert)
+    try:
+        await db.products.insert_many(
+            [product_document(Product(**product_data)) for product_data in SHOWCASE_PRODUCTS]
+        )
+        report = await insert_stream(db.products, generate_products(products, seed), enrich=search_fields)
+    except BaseException:
+        await release_marker(db, "sample-data")
+        raise
+    finally:
+        catalog_cache.clear()
+        await invalidate_products()
     
     return {
         "message": "Sample data initialized successfully", 
-        "products_created": len(products_to_insert)
+        "products_created": len(SHOWCASE_PRODUCTS) + report["inserted"]
     }
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Prometheus scrape endpoint; outside /api so the public proxy never serves it
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    body, content_type = render_metrics()
+    return PlainTextResponse(body, media_type=content_type)
+
+# Sheds load before the routes' rate limits; inside CORS, so browsers can
+# read its 503s
+app.add_middleware(
+    AdmissionMiddleware,
+    max_concurrency=ADMISSION_MAX_CONCURRENCY,
+    max_queue=ADMISSION_MAX_QUEUE,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+    exempt=("/api/health/",),
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Added last so it is outermost and times everything, CORS included
+app.add_middleware(MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -368,6 +1051,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+async def bootstrap_indexes():
+    # Creating indexes can be turned off where they are managed out of band;
+    # the app still refuses to start if a required one is missing.
+    create = os.environ.get('MONGO_CREATE_INDEXES', 'true').lower() == 'true'
+    await ensure_indexes(db, create=create)
+    await backfill_search_text()
+
+async def backfill_search_text():
+    # Products written before search existed, or by other tools
+    missing = db.products.find({"search_text": {"$exists": False}}, {"id": 1, "name": 1, "description": 1})
+    updates = [
+        UpdateOne({"id": product["id"]}, {"$set": search_fields(product)})
+        async for product in missing
+    ]
+    if updates:
+        await db.products.bulk_write(updates, ordered=False)
+        logger.info("Backfilled search_text for %d products", len(updates))
+
+def start_catalog_watch():
+    # Keeps the caches of all workers coherent; requires a replica set
+    if os.environ.get('CATALOG_CACHE_CHANGE_STREAM', 'false').lower() == 'true':
+        pre_images = os.environ.get('CATALOG_CACHE_PRE_IMAGES', 'false').lower() == 'true'
+        return asyncio.create_task(catalog_cache.watch(db.products, pre_images=pre_images))
+    return None
@@ -0,0 +1,56 @@
+"""Identical concurrent reads share one load.
+
+When many requests ask for the same thing at once, such as a launch page
+sending hundreds for one product, the first to arrive starts the load and
+the others await its result instead of each sending the same query and
+rendering the same JSON. Nothing is kept once the load finishes, so this
+is not a cache: a joining request can only miss a write made while the
+shared load was running, and calling `forget` after each write makes later
+requests start a fresh load instead.
+
+The load runs in its own task. A caller that goes away (a client
+disconnect cancels its handler) does not cancel the load for the others
+waiting on it.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.flights = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return loader()'s result, sharing a load already running for key."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(loader())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._landed(key, done))
+            self.flights += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _landed(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Don't warn about an exception every caller walked away from
+            task.exception()
+
+    def forget(self) -> None:
+        """Make requests from now on start new loads; those running still
+        finish for the callers already waiting on them."""
+        self._inflight.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.flights + self.coalesced
+        return {
+            "hits": self.coalesced,
+            "misses": self.flights,
+            "coalesced": self.coalesced,
+            "hit_ratio": self.coalesced / requests if requests else 0.0,
+        }
@@ -0,0 +1,68 @@
+"""Multi-document transactions with bounded retries.
+
+MongoDB labels the errors worth retrying. A TransientTransactionError (a
+write conflict with a concurrent transaction, a primary stepping down)
+aborted the whole transaction, so it is run again from the start. An
+UnknownTransactionCommitResult means the commit may or may not have been
+applied, so only the commit is retried; commitTransaction is idempotent,
+whereas running the body again could apply it twice.
+
+Both retry with jittered exponential backoff and give up after a bounded
+number of attempts, so that under heavy contention requests fail fast
+instead of piling up. Transactions need a replica set or sharded cluster.
+"""
+import os
+
+from pymongo import ReadPreference, WriteConcern
+from pymongo.errors import PyMongoError
+from pymongo.read_concern import ReadConcern
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, stop_after_delay, wait_random_exponential
+
+MAX_ATTEMPTS = int(os.environ.get('TRANSACTION_MAX_ATTEMPTS', '8'))
+MAX_SECONDS = float(os.environ.get('TRANSACTION_MAX_SECONDS', '5'))
+# Backoff between attempts grows from ~5ms up to this, randomized
+MAX_BACKOFF_SECONDS = float(os.environ.get('TRANSACTION_MAX_BACKOFF_SECONDS', '0.25'))
+
+
+def _has_label(label: str):
+    return lambda error: isinstance(error, PyMongoError) and error.has_error_label(label)
+
+
+def _retrying(label: str) -> AsyncRetrying:
+    return AsyncRetrying(
+        retry=retry_if_exception(_has_label(label)),
+        wait=wait_random_exponential(multiplier=0.005, max=MAX_BACKOFF_SECONDS),
+        stop=stop_after_attempt(MAX_ATTEMPTS) | stop_after_delay(MAX_SECONDS),
+        reraise=True,
+    )
+
+
+async def _commit(session) -> None:
+    async for attempt in _retrying("UnknownTransactionCommitResult"):
+        with attempt:
+            await session.commit_transaction()
+
+
+async def run_in_transaction(client, callback):
+    """Run `await callback(session)` in a transaction and commit it, retrying
+    transient failures; returns what the callback returned.
+
+    The callback may run more than once, so it must not have side effects
+    outside the database.
+    """
+    async for attempt in _retrying("TransientTransactionError"):
+        with attempt:
+            async with await client.start_session() as session:
+                session.start_transaction(
+                    read_concern=ReadConcern("snapshot"),
+                    write_concern=WriteConcern("majority"),
+                    read_preference=ReadPreference.PRIMARY,
+                )
+                try:
+                    result = await callback(session)
+                except BaseException:
+                    if session.in_transaction:
+                        await session.abort_transaction()
+                    raise
+                await _commit(session)
+                return result
@@ -0,0 +1,137 @@
+"""Trending and top-per-category product lists, precomputed.
+
+Ranking by recent activity means summing every hourly counter in
+`product_events` (see events.py) over the window, far too much work for
+each homepage hit. `refresh` does it periodically and replaces one
+document per list in `merchandising`, each embedding the ranked products,
+so serving a list is a single find_one on the unique `id` index.
+
+The embedded products are a snapshot: a price change shows up at the
+next refresh. Deleted products are pulled out of the lists right away
+(remove_product). Lists with too little activity to fill them are padded
+with featured products, then with the rest of the catalog; an empty
+catalog has no lists.
+
+Every app process runs refresh_periodically, but only the one holding the
+refresh lease (a document in `leases`) refreshes; the others check every
+interval and take over once a holder that stopped renewing lets it lapse.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+from events import CART_ADD, VIEW
+
+logger = logging.getLogger(__name__)
+
+TRENDING = "trending"
+# An add to cart says more about demand than a view
+CART_ADD_WEIGHT = 5
+# Ranked products considered per refresh, across all categories
+MAX_CANDIDATES = 2000
+
+
+def category_list(category: str) -> str:
+    return f"category:{category}"
+
+
+def list_name(category: Optional[str]) -> str:
+    return category_list(category) if category else TRENDING
+
+
+async def _ranked_ids(events, since: datetime) -> List[str]:
+    pipeline = [
+        {"$match": {"hour": {"$gte": since}}},
+        {"$group": {"_id": "$product_id", VIEW: {"$sum": f"${VIEW}"}, CART_ADD: {"$sum": f"${CART_ADD}"}}},
+        {"$project": {"score": {"$add": [f"${VIEW}", {"$multiply": [f"${CART_ADD}", CART_ADD_WEIGHT]}]}}},
+        {"$sort": {"score": -1, "_id": 1}},
+        {"$limit": MAX_CANDIDATES},
+    ]
+    return [ranked["_id"] async for ranked in events.aggregate(pipeline)]
+
+
+async def _padding(products, query: dict, fields: dict, exclude: List[str], count: int) -> List[dict]:
+    if count <= 0:
+        return []
+    query = {**query, "id": {"$nin": exclude}}
+    # Featured first; read backwards along the featured_id or
+    # category_featured_id index
+    return await products.find(query, fields).sort([("featured", -1), ("id", -1)]).limit(count).to_list(count)
+
+
+async def refresh(db, fields: dict, window: timedelta, size: int, now: Optional[datetime] = None) -> int:
+    """Recompute every list from the last `window` of events; returns how many."""
+    now = now or datetime.utcnow()
+    ranked_ids = await _ranked_ids(db.product_events, now - window)
+    found = {
+        product["id"]: product
+        async for product in db.products.find({"id": {"$in": ranked_ids}}, fields)
+    }
+    ranked = [found[product_id] for product_id in ranked_ids if product_id in found]
+
+    # List name -> the catalog it ranks
+    scopes = {TRENDING: {}}
+    for category in await db.products.distinct("category"):
+        scopes[category_list(category)] = {"category": category}
+    lists: Dict[str, List[dict]] = {}
+    for name, query in scopes.items():
+        products = [p for p in ranked if all(p.get(k) == v for k, v in query.items())][:size]
+        products += await _padding(db.products, query, fields, [p["id"] for p in products], size - len(products))
+        if products:
+            lists[name] = products
+
+    if lists:
+        # Each replacement is atomic, so readers see a whole old or new list
+        await db.merchandising.bulk_write(
+            [
+                ReplaceOne({"id": name}, {"id": name, "products": products, "computed_at": now}, upsert=True)
+                for name, products in lists.items()
+            ],
+            ordered=False,
+        )
+    await db.merchandising.delete_many({"id": {"$nin": list(lists)}})
+    return len(lists)
+
+
+async def remove_product(db, product_id: str) -> None:
+    await db.merchandising.update_many(
+        {"products.id": product_id}, {"$pull": {"products": {"id": product_id}}}
+    )
+
+
+async def hold_lease(leases, name: str, holder: str, ttl: timedelta, now: Optional[datetime] = None) -> bool:
+    """Take or renew the lease `name` for `ttl`; False while someone else holds it."""
+    now = now or datetime.utcnow()
+    try:
+        # Matches our own or a lapsed lease; otherwise the upsert collides
+        # with the holder's document on the unique id
+        await leases.update_one(
+            {"id": name, "$or": [{"holder": holder}, {"expires_at": {"$lte": now}}]},
+            {"$set": {"holder": holder, "expires_at": now + ttl}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def refresh_periodically(db, interval: float, **kwargs) -> None:
+    """Refresh the lists every `interval` seconds while holding the refresh
+    lease, starting now, until cancelled."""
+    holder = str(uuid.uuid4())
+    # Renewed every interval; outlives one slow refresh
+    ttl = timedelta(seconds=2 * interval)
+    while True:
+        try:
+            if await hold_lease(db.leases, TRENDING, holder, ttl):
+                await refresh(db, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Refreshing trending products failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""Throughput and tail latency of every API route under concurrent load.
+
+Starts the app in-process (its lifespan runs as it does under uvicorn)
+against MONGO_URL, or against mongomock-motor with --mongomock, seeds a
+catalog of --products products through the bulk import endpoint, then
+drives each api_router route with `concurrency` clients issuing requests
+back to back for --duration seconds, and reports requests/s, p50/p95/p99
+and responses with an unexpected status. --url drives a running stack
+instead (e.g. nginx on :8080), seeding it the same way.
+
+Only the measured request is timed. Routes that need something to act on
+(a cart line to remove, a product to delete) set it up with an untimed
+request first, which their requests/s includes.
+
+--save writes the results as a JSON baseline; --compare checks this run
+against one and exits 1 when any route's p95 grew, or its requests/s
+fell, by more than --tolerance, or it returned unexpected statuses. Only
+compare runs of the same backend, catalog size and machine; the baseline
+records the first two.
+
+Every api_router route must have a scenario below, or the run refuses to
+start. On mongomock, routes using what it cannot emulate ($text search,
+$lookup on arrays, transactions) are skipped. In-process runs use the
+`bench_api` database and drop it afterwards.
+
+    python benchmarks/bench_api.py --products 5000 --concurrency 1,16,64 --save baseline.json
+    python benchmarks/bench_api.py --products 5000 --concurrency 1,16,64 --compare baseline.json
+    python benchmarks/bench_api.py --mongomock --products 500 --duration 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ["DB_NAME"] = "bench_api"
+# One client hammering a few sessions is the point here, not abuse
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+
+CATEGORIES = ["Laptop", "Điện thoại", "Máy tính bảng", "Phụ kiện", "Đồng hồ"]
+# Each reservation takes stock; this never runs out during a run
+STOCK = 10 ** 9
+SEARCH_TERMS = ["laptop", "chip", "màn hình", "pin", "sản phẩm"]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def catalog_record(i: int) -> dict:
+    category = CATEGORIES[i % len(CATEGORIES)]
+    return {
+        "id": f"bench-{i:06d}",
+        "name": f"Sản phẩm {i}",
+        "description": f"{category} với chip mạnh mẽ, màn hình sắc nét và pin bền bỉ",
+        "price": float(1000 * (i % 500 + 1)),
+        "category": category,
+        "product_type": category.lower(),
+        "colors": ["#C0C0C0", "#222222"],
+        "images": [f"https://cdn.example.com/products/{i}/0.jpg"],
+        "stock": STOCK,
+        "featured": i % 10 == 0,
+    }
+
+
+def ndjson(records) -> bytes:
+    return b"".join(json.dumps(record, ensure_ascii=False).encode() + b"\n" for record in records)
+
+
+class Fixture:
+    """What scenarios draw on: the seeded catalog plus carts, users and
+    orders created during setup."""
+
+    def __init__(self, client: httpx.AsyncClient, product_ids: List[str]):
+        self.client = client
+        self.product_ids = product_ids
+        self.carts: List[str] = []
+        self.users: List[str] = []
+        self.orders: List[str] = []
+
+    def product(self) -> str:
+        return random.choice(self.product_ids)
+
+    async def cart_line(self, session_id: Optional[str] = None) -> Tuple[str, str]:
+        """Add a line to a (new) cart; returns the session and line ids."""
+        session_id = session_id or f"bench-{uuid.uuid4()}"
+        response = await self.client.post(f"/api/cart/{session_id}/items", json={
+            "product_id": self.product(), "quantity": 1, "selected_color": "#222222",
+        })
+        response.raise_for_status()
+        return session_id, response.json()["cart"]["items"][-1]["id"]
+
+    async def new_product(self) -> str:
+        response = await self.client.post("/api/products", json={**catalog_record(0), "name": "Tạm thời"})
+        response.raise_for_status()
+        return response.json()["id"]
+
+
+Prepare = Callable[[Fixture], Awaitable[Tuple[str, dict]]]
+
+
+@dataclass
+class Scenario:
+    method: str
+    route: str  # as declared on api_router
+    prepare: Prepare  # untimed; returns the URL and request arguments
+    expected: Tuple[int, ...] = (200,)
+    needs_mongodb: bool = False  # uses what mongomock cannot emulate
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.route}"
+
+
+def fixed(url: str, **kwargs) -> Prepare:
+    async def prepare(fixture):
+        return url, kwargs
+    return prepare
+
+
+async def _search(fixture):
+    return "/api/products/search", {"params": {"q": random.choice(SEARCH_TERMS)}}
+
+
+async def _product(fixture):
+    return f"/api/products/{fixture.product()}", {}
+
+
+async def _trending(fixture):
+    return "/api/products/trending", {"params": random.choice([{}, {"category": random.choice(CATEGORIES)}])}
+
+
+async def _view(fixture):
+    return f"/api/products/{fixture.product()}/views", {}
+
+
+async def _stock(fixture):
+    return f"/api/products/{fixture.product()}/stock", {}
+
+
+async def _create_product(fixture):
+    return "/api/products", {"json": {**catalog_record(0), "name": f"Mới {uuid.uuid4()}"}}
+
+
+async def _bulk(fixture):
+    # Without ids, so every row is inserted as a new product
+    records = [catalog_record(random.randrange(len(fixture.product_ids))) for _ in range(20)]
+    for record in records:
+        del record["id"]
+    return "/api/products/bulk", {
+        "content": ndjson(records), "headers": {"Content-Type": "application/x-ndjson"},
+    }
+
+
+async def _update_product(fixture):
+    return f"/api/products/{fixture.product()}", {"json": {"price": float(random.randrange(1000, 500000))}}
+
+
+async def _delete_product(fixture):
+    return f"/api/products/{await fixture.new_product()}", {}
+
+
+async def _listing(fixture):
+    return "/api/products", {"params": random.choice([{}, {"category": random.choice(CATEGORIES)}])}
+
+
+async def _cart(fixture):
+    return f"/api/cart/{random.choice(fixture.carts)}", {}
+
+
+async def _add_to_cart(fixture):
+    return f"/api/cart/bench-{uuid.uuid4()}/items", {"json": {
+        "product_id": fixture.product(), "quantity": 1, "selected_color": "#222222",
+    }}
+
+
+async def _remove_line(fixture):
+    session_id, item_id = await fixture.cart_line()
+    return f"/api/cart/{session_id}/items/{item_id}", {}
+
+
+async def _clear_cart(fixture):
+    session_id, _ = await fixture.cart_line()
+    return f"/api/cart/{session_id}", {}
+
+
+async def _cart_view(fixture):
+    return f"/api/cart/{random.choice(fixture.carts)}/view", {}
+
+
+async def _checkout(fixture):
+    session_id, _ = await fixture.cart_line()
+    return f"/api/cart/{session_id}/checkout", {"headers": {"Idempotency-Key": str(uuid.uuid4())}}
+
+
+async def _order(fixture):
+    return f"/api/orders/{random.choice(fixture.orders)}", {}
+
+
+async def _create_user(fixture):
+    return "/api/users", {"json": {"email": f"bench-{uuid.uuid4()}@example.com", "name": "Khách hàng"}}
+
+
+async def _user(fixture):
+    return f"/api/users/{random.choice(fixture.users)}", {}
+
+
+SCENARIOS = [
+    Scenario("GET", "/api/", fixed("/api/")),
+    Scenario("GET", "/api/health/live", fixed("/api/health/live")),
+    Scenario("GET", "/api/health/ready", fixed("/api/health/ready")),
+    Scenario("POST", "/api/status", fixed("/api/status", json={"client_name": "bench"})),
+    Scenario("GET", "/api/status", fixed("/api/status")),
+    Scenario("GET", "/api/products", _listing),
+    Scenario("GET", "/api/products/search", _search, needs_mongodb=True),
+    Scenario("GET", "/api/products/trending", _trending),
+    Scenario("GET", "/api/products/{product_id}", _product),
+    Scenario("GET", "/api/products/{product_id}/stock", _stock),
+    Scenario("GET", "/api/cart/{session_id}", _cart),
+    Scenario("GET", "/api/cart/{session_id}/view", _cart_view, needs_mongodb=True),
+    Scenario("GET", "/api/orders/{order_id}", _order, needs_mongodb=True),
+    Scenario("GET", "/api/users/{user_id}", _user),
+    Scenario("GET", "/api/cache/stats", fixed("/api/cache/stats")),
+    Scenario("POST", "/api/init-sample-data", fixed("/api/init-sample-data")),
+    Scenario("POST", "/api/products/{product_id}/views", _view, expected=(202,)),
+    Scenario("POST", "/api/cart/{session_id}/items", _add_to_cart),
+    Scenario("DELETE", "/api/cart/{session_id}/items/{item_id}", _remove_line),
+    Scenario("DELETE", "/api/cart/{session_id}", _clear_cart),
+    Scenario("POST", "/api/cart/{session_id}/checkout", _checkout, needs_mongodb=True),
+    Scenario("POST", "/api/users", _create_user),
+    Scenario("POST", "/api/products", _create_product),
+    Scenario("PUT", "/api/products/{product_id}", _update_product),
+    Scenario("DELETE", "/api/products/{product_id}", _delete_product),
+    Scenario("POST", "/api/products/bulk", _bulk),
+]
+
+
+def check_coverage(api_router) -> None:
+    routes = {f"{method} {route.path}" for route in api_router.routes for method in route.methods}
+    covered = {scenario.name for scenario in SCENARIOS}
+    if routes - covered:
+        sys.exit(f"No load scenario for: {', '.join(sorted(routes - covered))}")
+    if covered - routes:
+        sys.exit(f"Scenarios for routes that no longer exist: {', '.join(sorted(covered - routes))}")
+
+
+def use_mongomock(server) -> None:
+    """Run the app on mongomock-motor, an in-memory stand-in that shows the
+    cost of the app itself rather than of the database."""
+    from mongomock_motor import AsyncMongoMockClient, AsyncMongoMockDatabase
+    from indexes import IndexBootstrapError
+
+    server.AsyncIOMotorClient = AsyncMongoMockClient
+    # One in-memory store, so read preferences mean nothing
+    AsyncMongoMockDatabase.with_options = lambda self, **kwargs: self
+    ensure_indexes = server.ensure_indexes
+
+    async def ensure_indexes_leniently(db, **kwargs):
+        # mongomock does not report text or partial index options back
+        try:
+            return await ensure_indexes(db, **kwargs)
+        except IndexBootstrapError as e:
+            print(f"ignoring on mongomock: {e}")
+
+    server.ensure_indexes = ensure_indexes_leniently
+
+    # Given a projection, mongomock looks the updated document up again by the
+    # original filter, so an update that makes it stop matching (adding the
+    # line a filter says is absent) returns None where MongoDB returns it
+    import mongomock.collection
+    from pymongo import ReturnDocument
+    find_one_and_update = mongomock.collection.Collection.find_one_and_update
+
+    def find_one_and_update_then_project(self, filter, update, projection=None, **kwargs):
+        if not projection or kwargs.get("return_document") != ReturnDocument.AFTER:
+            return find_one_and_update(self, filter, update, projection=projection, **kwargs)
+        document = find_one_and_update(self, filter, update, **kwargs)
+        if document is None:
+            return None
+        if any(projection.values()):
+            return {key: value for key, value in document.items()
+                    if projection.get(key, key == "_id")}
+        return {key: value for key, value in document.items() if key not in projection}
+
+    mongomock.collection.Collection.find_one_and_update = find_one_and_update_then_project
+
+
+@asynccontextmanager
+async def api_client(url: Optional[str], mongomock: bool):
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+            yield client
+        return
+
+    from dotenv import load_dotenv
+    load_dotenv(Path(__file__).resolve().parent.parent / "backend" / ".env")
+    import server
+    if mongomock:
+        use_mongomock(server)
+    check_coverage(server.api_router)
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30) as client:
+            yield client
+        await server.client.drop_database("bench_api")
+
+
+async def seed(client: httpx.AsyncClient, products: int, mongomock: bool) -> Fixture:
+    records = [catalog_record(i) for i in range(products)]
+    for start in range(0, products, 1000):
+        response = await client.post(
+            "/api/products/bulk", content=ndjson(records[start:start + 1000]),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        response.raise_for_status()
+    fixture = Fixture(client, [record["id"] for record in records])
+
+    for _ in range(50):
+        session_id, _ = await fixture.cart_line()
+        for _ in range(2):
+            await fixture.cart_line(session_id)
+        fixture.carts.append(session_id)
+        url, kwargs = await _create_user(fixture)
+        fixture.users.append((await client.post(url, **kwargs)).json()["id"])
+        if not mongomock:
+            url, kwargs = await _checkout(fixture)
+            response = await client.post(url, **kwargs)
+            response.raise_for_status()
+            fixture.orders.append(response.json()["id"])
+    return fixture
+
+
+async def drive(client: httpx.AsyncClient, scenario: Scenario, fixture: Fixture,
+                concurrency: int, duration: float) -> dict:
+    latencies, unexpected = [], Counter()
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            url, kwargs = await scenario.prepare(fixture)
+            start = time.perf_counter()
+            response = await client.request(scenario.method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code not in scenario.expected:
+                unexpected[response.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1e3, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1e3, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1e3, 3),
+        "unexpected": dict(unexpected),
+    }
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    found = []
+    for name, levels in results.items():
+        for concurrency, result in levels.items():
+            before = baseline["results"].get(name, {}).get(concurrency)
+            if before is None:
+                continue
+            where = f"{name} at concurrency {concurrency}"
+            if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                found.append(f"{where}: p95 {before['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms")
+            if result["rps"] < before["rps"] * (1 - tolerance):
+                found.append(f"{where}: {before['rps']:.0f} -> {result['rps']:.0f} req/s")
+            if result["unexpected"] and not before["unexpected"]:
+                found.append(f"{where}: unexpected responses {result['unexpected']}")
+    return found
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1000, help="catalog size to seed")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 16, 64])
+    parser.add_argument("--duration", type=float, default=5, help="seconds per route and concurrency")
+    parser.add_argument("--warmup", type=float, default=1, help="unrecorded seconds before each route")
+    parser.add_argument("--route", action="append", help="only routes containing this; repeatable")
+    parser.add_argument("--mongomock", action="store_true", help="run the app on mongomock-motor")
+    parser.add_argument("--url", help="drive a running stack instead, e.g. http://localhost:8080")
+    parser.add_argument("--save", type=Path, help="write the results here as a baseline")
+    parser.add_argument("--compare", type=Path, help="fail on regressions against this baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change")
+    args = parser.parse_args()
+    if args.url and args.mongomock:
+        parser.error("--mongomock starts the app in-process; it cannot be combined with --url")
+
+    backend = args.url or ("mongomock" if args.mongomock else "mongodb")
+    scenarios = [
+        scenario for scenario in SCENARIOS
+        if not args.route or any(part in scenario.name for part in args.route)
+    ]
+    results: Dict[str, Dict[str, dict]] = {}
+    async with api_client(args.url, args.mongomock) as client:
+        fixture = await seed(client, args.products, args.mongomock)
+        print(f"{args.products} products, {backend}, {args.duration:g}s per level")
+        print(f"{'route':<48} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  unexpected")
+        for scenario in scenarios:
+            if args.mongomock and scenario.needs_mongodb:
+                print(f"{scenario.name:<48} skipped, needs MongoDB")
+                continue
+            if args.warmup:
+                await drive(client, scenario, fixture, args.concurrency[0], args.warmup)
+            for concurrency in args.concurrency:
+                result = await drive(client, scenario, fixture, concurrency, args.duration)
+                results.setdefault(scenario.name, {})[str(concurrency)] = result
+                print(f"{scenario.name:<48} {concurrency:>5} {result['rps']:>8.0f} {result['p50_ms']:>8.2f}"
+                      f" {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}  {result['unexpected'] or ''}")
+
+    run = {
+        "meta": {
+            "backend": backend,
+            "products": args.products,
+            "duration": args.duration,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.node(),
+        },
+        "results": results,
+    }
+    if args.save:
+        args.save.write_text(json.dumps(run, indent=2, ensure_ascii=False) + "\n")
+        print(f"saved baseline to {args.save}")
+
+    failed = any(result["unexpected"] for levels in results.values() for result in levels.values())
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        for key in ("backend", "products"):
+            if baseline["meta"][key] != run["meta"][key]:
+                print(f"warning: baseline {key} was {baseline['meta'][key]}, this run {run['meta'][key]}")
+        found = regressions(results, baseline, args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        failed = failed or bool(found)
+        if not found:
+            print(f"no regressions beyond {args.tolerance:.0%} against {args.compare}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
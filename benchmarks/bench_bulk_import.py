@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Throughput of the bulk product import.
+
+Imports a generated feed into a scratch collection of the configured
+database (MONGO_URL / DB_NAME from backend/.env) for several batch sizes and
+concurrency levels, first as inserts and then as upserts of the same ids.
+
+    python benchmarks/bench_bulk_import.py --rows 20000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).resolve().parent.parent / "backend" / ".env")
+
+from bulk_import import import_products
+from server import Product, ProductCreate, search_fields
+
+COLLECTION = "bench_bulk_import"
+
+
+async def feed(rows: int, with_ids: bool):
+    for i in range(rows):
+        record = {
+            "name": f"Sản phẩm {i}",
+            "description": "Tai nghe không dây cao cấp với chống ồn chủ động",
+            "price": 1000 + i,
+            "category": ("Laptop", "Smartphone", "Audio", "Wearable")[i % 4],
+            "product_type": ("laptop", "phone", "headphones", "watch")[i % 4],
+            "colors": ["#FFFFFF", "#222222"],
+            "stock": i % 100,
+            "featured": i % 10 == 0,
+        }
+        if with_ids:
+            record["id"] = f"bench-{i:08d}"
+        yield record
+
+
+async def run(collection, rows, batch_size, concurrency, with_ids):
+    start = time.perf_counter()
+    report = await import_products(
+        collection, feed(rows, with_ids), ProductCreate, Product,
+        batch_size=batch_size, concurrency=concurrency, enrich=search_fields,
+    )
+    elapsed = time.perf_counter() - start
+    assert report["failed"] == 0, report["results"][:5]
+    return rows / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 500, 1000, 5000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    collection = client[os.environ["DB_NAME"]][COLLECTION]
+    await collection.create_index("id", unique=True)
+    print(f"{'batch':>6} {'conc':>5} {'insert rows/s':>14} {'upsert rows/s':>14}")
+    try:
+        for batch_size in args.batch_sizes:
+            for concurrency in args.concurrency:
+                await collection.delete_many({})
+                inserted = await run(collection, args.rows, batch_size, concurrency, with_ids=False)
+                await collection.delete_many({})
+                await run(collection, args.rows, batch_size, concurrency, with_ids=True)
+                upserted = await run(collection, args.rows, batch_size, concurrency, with_ids=True)
+                print(f"{batch_size:>6} {concurrency:>5} {inserted:>14.0f} {upserted:>14.0f}")
+    finally:
+        await collection.drop()
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Bytes on the wire and latency of product responses, compressed or not.
+
+Offline (default): encodes product listings the way the API does and
+reports their size under gzip at nginx's level, so the effect of
+gzip_comp_level and gzip_min_length can be seen without a deployment.
+
+Against a running stack (--url): fetches each URL with and without
+`Accept-Encoding: gzip`, over one kept-alive connection and over a new
+connection per request, and reports bytes downloaded and p50/p95 latency.
+Point it at nginx (:8080) to measure the proxy, and at uvicorn (:8001)
+for the baseline without it.
+
+    python benchmarks/bench_compression.py --items 1,10,50
+    python benchmarks/bench_compression.py --url http://localhost:8080/api/products --requests 200
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+# nginx.conf settings
+GZIP_COMP_LEVEL = 5
+GZIP_MIN_LENGTH = 1024
+
+
+def offline(item_counts, rounds):
+    from bench_serialization import make_documents
+    from server import product_list_adapter
+    from serialization import encode
+
+    print(f"{'items':>6} {'raw bytes':>10} {'gzip bytes':>11} {'ratio':>6} {'gzip us':>8}")
+    for count in item_counts:
+        body = encode(make_documents(count), product_list_adapter)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            compressed = gzip.compress(body, compresslevel=GZIP_COMP_LEVEL)
+        compress_us = (time.perf_counter() - start) / rounds * 1e6
+        if len(body) < GZIP_MIN_LENGTH:
+            print(f"{count:>6} {len(body):>10} {'(below gzip_min_length, sent as is)':>27}")
+            continue
+        print(f"{count:>6} {len(body):>10} {len(compressed):>11} {len(body) / len(compressed):>5.1f}x {compress_us:>8.0f}")
+
+
+def fetch(client, url, encoding):
+    start = time.perf_counter()
+    with client.stream("GET", url, headers={"Accept-Encoding": encoding}) as response:
+        response.raise_for_status()
+        for _ in response.iter_raw():
+            pass
+        downloaded = response.num_bytes_downloaded
+    return time.perf_counter() - start, downloaded
+
+
+def online(urls, requests):
+    import httpx
+
+    print(f"{'url':<45} {'encoding':>8} {'connection':>10} {'bytes':>8} {'p50 ms':>7} {'p95 ms':>7}")
+    for url in urls:
+        for encoding in ("identity", "gzip"):
+            for reuse in (True, False):
+                timings, downloaded = [], 0
+                client = httpx.Client(http2=False) if reuse else None
+                for _ in range(requests):
+                    if reuse:
+                        elapsed, downloaded = fetch(client, url, encoding)
+                    else:
+                        with httpx.Client() as fresh:
+                            elapsed, downloaded = fetch(fresh, url, encoding)
+                    timings.append(elapsed)
+                if client:
+                    client.close()
+                timings.sort()
+                print(f"{url[-45:]:<45} {encoding:>8} {'keepalive' if reuse else 'new':>10} {downloaded:>8}"
+                      f" {timings[len(timings) // 2] * 1e3:>7.2f} {timings[int(len(timings) * 0.95)] * 1e3:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", default="1,10,50,200", help="products per listing, offline mode")
+    parser.add_argument("--rounds", type=int, default=200, help="compressions timed per size, offline mode")
+    parser.add_argument("--url", action="append", help="measure a running stack instead; repeatable")
+    parser.add_argument("--requests", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.url:
+        online(args.url, args.requests)
+    else:
+        offline([int(count) for count in args.items.split(",")], args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Reservation throughput on one hot product, and an oversell check.
+
+Starts `attempts` reservations of one unit each for distinct sessions,
+`concurrency` at a time, against a product with `stock` units, and reports
+attempts/s plus how many got stock. Fails if more units were reserved than
+existed. Needs a real MongoDB at MONGO_URL (backend/.env is read); it uses
+the `bench_inventory` database.
+
+    python benchmarks/bench_inventory.py --stock 1000 --attempts 20000 --concurrency 50,200,500
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from indexes import ensure_indexes
+from inventory import OutOfStock, release_expired, reserve
+
+load_dotenv(Path(__file__).resolve().parent.parent / "backend" / ".env")
+
+
+async def run(db, stock, attempts, concurrency):
+    await db.products.delete_many({"id": "hot-product"})
+    await db.reservations.delete_many({})
+    await db.products.insert_one({"id": "hot-product", "name": "Flash sale", "stock": stock})
+
+    semaphore = asyncio.Semaphore(concurrency)
+    sold_out = 0
+
+    async def attempt(i):
+        nonlocal sold_out
+        async with semaphore:
+            try:
+                await reserve(db, f"session-{i}", "hot-product", 1, timedelta(minutes=15))
+            except OutOfStock:
+                sold_out += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(attempt(i) for i in range(attempts)))
+    elapsed = time.perf_counter() - start
+
+    left = (await db.products.find_one({"id": "hot-product"}))["stock"]
+    held = await db.reservations.count_documents({})
+    oversold = held > stock or left < 0 or held + left != stock
+    print(f"{concurrency:>11} {attempts / elapsed:>10.0f} {held:>9} {sold_out:>9} {left:>6}"
+          f"  {'OVERSOLD' if oversold else 'ok'}")
+
+    # Expire everything and check the sweeper gives all of it back
+    await db.reservations.update_many({}, {"$set": {"expires_at": datetime(1970, 1, 1)}})
+    while await release_expired(db):
+        pass
+    restored = (await db.products.find_one({"id": "hot-product"}))["stock"]
+    if restored != stock:
+        print(f"  sweeper restored {restored} of {stock}")
+    return not oversold and restored == stock
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stock", type=int, default=1000)
+    parser.add_argument("--attempts", type=int, default=10000)
+    parser.add_argument("--concurrency", default="50,200", help="comma separated")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client["bench_inventory"]
+    await ensure_indexes(db)
+
+    print(f"{args.attempts} one-unit reservations of a product with {args.stock} in stock")
+    print(f"{'concurrency':>11} {'attempts/s':>10} {'reserved':>9} {'sold out':>9} {'left':>6}")
+    ok = True
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        ok = await run(db, args.stock, args.attempts, concurrency) and ok
+
+    await client.drop_database("bench_inventory")
+    client.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
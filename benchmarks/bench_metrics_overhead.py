@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Cost of the Prometheus instrumentation.
+
+Times a trivial route with and without MetricsMiddleware, and the Mongo
+command listener on its own (one started + succeeded pair per command).
+
+    python benchmarks/bench_metrics_overhead.py --requests 2000 --rounds 5
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import httpx
+from fastapi import FastAPI
+
+from metrics import CommandMetrics, MetricsMiddleware
+
+
+def make_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/products/{product_id}")
+    async def get_product(product_id: str):
+        return {"id": product_id}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def time_requests(app, requests):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/api/products/warmup")
+        start = time.perf_counter()
+        for i in range(requests):
+            await client.get(f"/api/products/{i}")
+        return (time.perf_counter() - start) / requests * 1e6
+
+
+def measure_listener(commands):
+    listener = CommandMetrics()
+    started = [
+        SimpleNamespace(command_name="find", command={"find": "products"}, connection_id=("db", 27017), request_id=i)
+        for i in range(commands)
+    ]
+    succeeded = [
+        SimpleNamespace(command_name="find", connection_id=("db", 27017), request_id=i, duration_micros=800)
+        for i in range(commands)
+    ]
+    start = time.perf_counter()
+    for begin, end in zip(started, succeeded):
+        listener.started(begin)
+        listener.succeeded(end)
+    per_command_us = (time.perf_counter() - start) / commands * 1e6
+    print(f"{'command listener':<28} {per_command_us:8.2f} us/command")
+    return per_command_us
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5, help="best of, alternating the two apps")
+    parser.add_argument("--commands", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests through an in-process ASGI client, best of {args.rounds}")
+    bare_app, instrumented_app = make_app(False), make_app(True)
+    bare, instrumented = [], []
+    for _ in range(args.rounds):
+        bare.append(await time_requests(bare_app, args.requests))
+        instrumented.append(await time_requests(instrumented_app, args.requests))
+    print(f"{'without middleware':<28} {min(bare):8.1f} us/request")
+    print(f"{'with MetricsMiddleware':<28} {min(instrumented):8.1f} us/request")
+    print(f"Middleware overhead: {min(instrumented) - min(bare):.1f} us/request")
+    measure_listener(args.commands)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Tail latency of product reads under concurrency, per pool setting.
+
+Runs `concurrency` tasks, each issuing find_one by id back to back, against
+a fresh client for every combination of the given settings, and reports
+p50/p95/p99 plus the checkouts that hit the wait-queue timeout. Needs a
+real MongoDB at MONGO_URL (backend/.env is read); it writes to the
+`bench_pool` collection.
+
+    python benchmarks/bench_pool.py --pool-sizes 5,20,100 --concurrency 50,200 \\
+        --compressors none,zstd --wait-queue-timeout-ms 0,200 --prewarm 0,1
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import ConnectionFailure
+
+from database import prewarm_pool
+
+load_dotenv(Path(__file__).resolve().parent.parent / "backend" / ".env")
+
+COLLECTION = "bench_pool"
+DESCRIPTION = "Laptop cao cấp với chip M3 mạnh mẽ, màn hình Retina 14 inch tuyệt đẹp " * 4
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def seed(collection, documents):
+    await collection.drop()
+    await collection.insert_many(
+        [{"id": f"product-{i:06d}", "name": f"Sản phẩm {i}", "description": DESCRIPTION, "price": 1000.0 * i}
+         for i in range(documents)]
+    )
+    await collection.create_index("id", unique=True)
+
+
+async def run(url, db_name, documents, concurrency, requests, options, prewarm):
+    client = AsyncIOMotorClient(url, **options)
+    collection = client[db_name][COLLECTION]
+    if prewarm:
+        await prewarm_pool(client, options.get("maxPoolSize", 100))
+    latencies, timeouts = [], 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, timeouts
+        while remaining > 0:
+            remaining -= 1
+            product_id = f"product-{random.randrange(documents):06d}"
+            start = time.perf_counter()
+            try:
+                await collection.find_one({"id": product_id}, {"_id": 0})
+            except ConnectionFailure:
+                timeouts += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    client.close()
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 0.50) * 1e3,
+        "p95": percentile(latencies, 0.95) * 1e3,
+        "p99": percentile(latencies, 0.99) * 1e3,
+        "timeouts": timeouts,
+    }
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=5000, help="reads per combination")
+    parser.add_argument("--pool-sizes", type=int_list, default=[10, 100])
+    parser.add_argument("--concurrency", type=int_list, default=[50, 200])
+    parser.add_argument("--compressors", default="none", help="comma separated, 'none' for no compression")
+    parser.add_argument("--wait-queue-timeout-ms", type=int_list, default=[0], help="0 waits forever")
+    parser.add_argument("--prewarm", type=int_list, default=[1], help="0, 1 or both")
+    parser.add_argument("--read-preference", default="primary")
+    args = parser.parse_args()
+
+    url, db_name = os.environ["MONGO_URL"], os.environ["DB_NAME"]
+    seed_client = AsyncIOMotorClient(url)
+    await seed(seed_client[db_name][COLLECTION], args.documents)
+
+    print(f"{'pool':>5} {'conc':>5} {'compress':>9} {'waitq':>6} {'warm':>5}"
+          f" {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'timeouts':>9}")
+    grid = itertools.product(
+        args.pool_sizes, args.concurrency, args.compressors.split(","), args.wait_queue_timeout_ms, args.prewarm
+    )
+    for pool_size, concurrency, compressor, wait_queue_timeout, prewarm in grid:
+        options = {"maxPoolSize": pool_size, "readPreference": args.read_preference}
+        if compressor != "none":
+            options["compressors"] = compressor
+        if wait_queue_timeout:
+            options["waitQueueTimeoutMS"] = wait_queue_timeout
+        result = await run(url, db_name, args.documents, concurrency, args.requests, options, prewarm)
+        print(f"{pool_size:>5} {concurrency:>5} {compressor:>9} {wait_queue_timeout or '-':>6} {prewarm:>5}"
+              f" {result['rps']:>8.0f} {result['p50']:>8.2f} {result['p95']:>8.2f} {result['p99']:>8.2f}"
+              f" {result['timeouts']:>9}")
+
+    await seed_client[db_name][COLLECTION].drop()
+    seed_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
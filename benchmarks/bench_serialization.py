@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Per-item cost of serializing product listings.
+
+Compares the old read path (build a Product per document, then let FastAPI
+validate and encode the response through response_model) with the fast path
+(encode the projected documents directly), plus strict mode.
+
+    python benchmarks/bench_serialization.py --items 50 --rounds 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from server import Product, product_list_adapter
+from serialization import encode
+
+
+def make_documents(count: int) -> List[dict]:
+    now = datetime.utcnow().replace(microsecond=123000)
+    return [
+        {
+            "id": f"product-{i:06d}",
+            "name": f"Sản phẩm {i}",
+            "description": "Laptop cao cấp với chip M3 mạnh mẽ, màn hình Retina 14 inch tuyệt đẹp",
+            "price": 29999000.0,
+            "category": "Laptop",
+            "product_type": "laptop",
+            "colors": ["#C0C0C0", "#222222", "#FFD700"],
+            "model_url": None,
+            "images": [f"https://cdn.example.com/products/{i}/{n}.jpg" for n in range(3)],
+            "stock": 25,
+            "featured": i % 2 == 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+async def model_path(documents, field):
+    products = [Product(**document) for document in documents]
+    content = await serialize_response(field=field, response_content=products)
+    return JSONResponse(content).body
+
+
+async def fast_path(documents, _):
+    return encode(documents, product_list_adapter)
+
+
+async def strict_path(documents, _):
+    return encode(documents, product_list_adapter, strict=True)
+
+
+async def measure(name, path, documents, field, rounds):
+    await path(documents, field)  # warm up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await path(documents, field)
+    elapsed = time.perf_counter() - start
+    per_item_us = elapsed / (rounds * len(documents)) * 1e6
+    print(f"{name:<28} {per_item_us:8.2f} us/item  {elapsed / rounds * 1e3:8.3f} ms/response")
+    return per_item_us
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=50, help="products per response")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    documents = make_documents(args.items)
+    field = create_response_field("Response_get_products", List[Product])
+    assert await model_path(documents, field) == await fast_path(documents, field)
+
+    print(f"Serializing {args.items} products x {args.rounds} rounds")
+    before = await measure("models + response_model", model_path, documents, field, args.rounds)
+    after = await measure("fast path", fast_path, documents, field, args.rounds)
+    await measure("strict mode", strict_path, documents, field, args.rounds)
+    print(f"Speed-up: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -646,7 +646,8 @@ const Homepage = () => {
   useEffect(() => {
     const fetchProducts = async () => {
       try {
-        const response = await axios.get(`${API}/products?featured=true&limit=8`);
+        // Ranked by recent views and adds to cart, precomputed server side
+        const response = await axios.get(`${API}/products/trending?limit=8`);
         setProducts(response.data);
       } catch (error) {
         console.error('Error fetching products:', error);
@@ -1284,6 +1285,8 @@ const ProductDetailPage = () => {
           if (response.data?.colors?.[0]) {
             setSelectedColor(response.data.colors[0]);
           }
+          // Counts towards trending; failures are not worth surfacing
+          axios.post(`${API}/products/${productId}/views`).catch(() => {});
         }
       } catch (error) {
         console.error('Error fetching product:', error);
@@ -1574,6 +1577,10 @@ const ShoppingCartPage = () => {
   const [cart, setCart] = useState(null);
   const [loading, setLoading] = useState(true);
   const [sessionId, setSessionId] = useState(null);
+  const [placingOrder, setPlacingOrder] = useState(false);
+  // One key per checkout attempt, reused by its retries so a request that
+  // timed out but went through is not placed twice
+  const checkoutKey = useRef(null);
 
   useEffect(() => {
     const fetchCart = async () => {
@@ -1586,7 +1593,7 @@ const ShoppingCartPage = () => {
         }
         setSessionId(currentSessionId);
         
-        const response = await axios.get(`${API}/cart/${currentSessionId}`);
+        const response = await axios.get(`${API}/cart/${currentSessionId}/view`);
         setCart(response.data);
       } catch (error) {
         console.error('Error fetching cart:', error);
@@ -1601,7 +1608,7 @@ const ShoppingCartPage = () => {
     try {
       await axios.delete(`${API}/cart/${sessionId}/items/${itemId}`);
       // Refresh cart
-      const response = await axios.get(`${API}/cart/${sessionId}`);
+      const response = await axios.get(`${API}/cart/${sessionId}/view`);
       setCart(response.data);
     } catch (error) {
       console.error('Error removing from cart:', error);
@@ -1612,13 +1619,46 @@ const ShoppingCartPage = () => {
     try {
       await axios.delete(`${API}/cart/${sessionId}`);
       // Refresh cart
-      const response = await axios.get(`${API}/cart/${sessionId}`);
+      const response = await axios.get(`${API}/cart/${sessionId}/view`);
       setCart(response.data);
     } catch (error) {
       console.error('Error clearing cart:', error);
     }
   };
 
+  const placeOrder = async () => {
+    checkoutKey.current = checkoutKey.current || crypto.randomUUID();
+    setPlacingOrder(true);
+    try {
+      let response;
+      for (let attempt = 0; ; attempt++) {
+        try {
+          response = await axios.post(`${API}/cart/${sessionId}/checkout`, null, {
+            headers: { 'Idempotency-Key': checkoutKey.current }
+          });
+          break;
+        } catch (error) {
+          const status = error.response?.status;
+          if (attempt >= 2 || (status && status !== 503)) throw error;
+          await new Promise((resolve) => setTimeout(resolve, 1000 * (attempt + 1)));
+        }
+      }
+      checkoutKey.current = null;
+      alert(`Đặt hàng thành công! Mã đơn hàng: ${response.data.id}`);
+      const cartResponse = await axios.get(`${API}/cart/${sessionId}/view`);
+      setCart(cartResponse.data);
+    } catch (error) {
+      console.error('Error placing order:', error);
+      if (error.response?.status === 409) {
+        // The cart changed; the next attempt is a different order
+        checkoutKey.current = null;
+      }
+      alert(error.response?.status === 409 ? 'Một số sản phẩm đã hết hàng!' : 'Có lỗi xảy ra khi đặt hàng!');
+    } finally {
+      setPlacingOrder(false);
+    }
+  };
+
   if (loading) {
     return (
       <div className="min-h-screen bg-gray-50 flex items-center justify-center">
@@ -1667,7 +1707,7 @@ const ShoppingCartPage = () => {
                         <ambientLight intensity={0.6} />
                         <directionalLight position={[5, 5, 5]} intensity={1} />
                         <Product3D 
-                          productType="laptop" // You'd fetch the actual product type
+                          productType={item.product_type || "laptop"}
                           color={item.selected_color}
                           rotation={true}
                           scale={0.6}
@@ -1679,7 +1719,7 @@ const ShoppingCartPage = () => {
                     {/* Product Info */}
                     <div className="flex-1">
                       <h3 className="text-xl font-bold text-gray-900 mb-2">
-                        Sản phẩm #{item.product_id}
+                        {item.available ? item.name : 'Sản phẩm không còn bán'}
                       </h3>
                       <p className="text-gray-600 mb-2">Màu đã chọn:</p>
                       <div className="flex items-center space-x-2 mb-2">
@@ -1692,6 +1732,11 @@ const ShoppingCartPage = () => {
                       <p className="text-lg font-semibold text-orange-500">
                         Số lượng: {item.quantity}
                       </p>
+                      {item.available && (
+                        <p className="text-gray-600">
+                          {item.price?.toLocaleString('vi-VN')}₫ × {item.quantity} = {item.line_total?.toLocaleString('vi-VN')}₫
+                        </p>
+                      )}
                     </div>
 
                     {/* Actions */}
@@ -1727,7 +1772,7 @@ const ShoppingCartPage = () => {
               <div className="space-y-4 mb-6">
                 <div className="flex justify-between">
                   <span className="text-gray-600">Tạm tính:</span>
-                  <span className="font-semibold">0₫</span>
+                  <span className="font-semibold">{(cart?.subtotal || 0).toLocaleString('vi-VN')}₫</span>
                 </div>
                 <div className="flex justify-between">
                   <span className="text-gray-600">Phí vận chuyển:</span>
@@ -1740,14 +1785,18 @@ const ShoppingCartPage = () => {
                 <div className="border-t pt-4">
                   <div className="flex justify-between text-xl">
                     <span className="font-bold text-gray-900">Tổng cộng:</span>
-                    <span className="font-bold text-orange-500">0₫</span>
+                    <span className="font-bold text-orange-500">{(cart?.subtotal || 0).toLocaleString('vi-VN')}₫</span>
                   </div>
                 </div>
               </div>
 
               <div className="space-y-4">
-                <button className="w-full bg-orange-500 text-white py-4 rounded-xl font-semibold text-lg hover:bg-orange-600 transition">
-                  Thanh toán
+                <button
+                  onClick={placeOrder}
+                  disabled={placingOrder || !cart?.items?.length}
+                  className="w-full bg-orange-500 text-white py-4 rounded-xl font-semibold text-lg hover:bg-orange-600 transition disabled:opacity-50"
+                >
+                  {placingOrder ? 'Đang đặt hàng...' : 'Thanh toán'}
                 </button>
                 <button className="w-full border-2 border-orange-500 text-orange-500 py-3 rounded-xl font-semibold hover:bg-orange-500 hover:text-white transition">
                   Tiếp tục mua sắm
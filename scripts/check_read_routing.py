@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Check which replica set member serves each endpoint's MongoDB commands.
+
+Catalog reads should go to a secondary; writes and read-after-write to the
+primary. Runs the app in-process against the replica set at MONGO_URL (see
+scripts/local-replica-set.sh) with the in-process cache disabled, and exits
+non-zero on any command sent to the wrong member.
+
+    python scripts/check_read_routing.py
+"""
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from pymongo import monitoring
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0")
+os.environ.setdefault("DB_NAME", "read_routing_check")
+os.environ["CATALOG_CACHE_TTL_SECONDS"] = "0"
+os.environ.pop("REDIS_URL", None)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+class Recorder(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name not in ("hello", "isMaster", "ismaster", "endSessions"):
+            self.commands.append((event.command_name, event.connection_id))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+recorder = Recorder()
+monitoring.register(recorder)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import server  # noqa: E402
+
+
+def main():
+    failures = 0
+    with TestClient(server.app) as client:
+        primary = server.client.primary
+        client.post("/api/init-sample-data")
+        product_id = client.get("/api/products").json()[0]["id"]
+        # Let the secondaries catch up before checking where reads land
+        time.sleep(2)
+
+        def check(name, expect, request):
+            nonlocal failures
+            recorder.commands.clear()
+            response = request()
+            commands = list(recorder.commands)
+            if expect == "secondary":
+                # The first command must go to a secondary; a primary re-check may follow a miss
+                ok = bool(commands) and commands[0][1] != primary
+            else:
+                ok = bool(commands) and all(address == primary for _, address in commands)
+            failures += not ok
+            served = ", ".join(
+                f"{command}@{'primary' if address == primary else '%s:%s' % address}" for command, address in commands
+            )
+            print(f"{'ok  ' if ok else 'FAIL'} {name:<28} {response.status_code}  expected {expect:<9} got {served}")
+
+        check("GET /products", "secondary", lambda: client.get("/api/products"))
+        check("GET /products/{id}", "secondary", lambda: client.get(f"/api/products/{product_id}"))
+        check("GET /products/search", "secondary", lambda: client.get("/api/products/search", params={"category": "Laptop"}))
+        user = {"email": f"{uuid.uuid4().hex}@example.com", "name": "Routing check"}
+        user_id = None
+
+        def create_user():
+            nonlocal user_id
+            response = client.post("/api/users", json=user)
+            user_id = response.json()["id"]
+            return response
+
+        check("POST /users", "primary", create_user)
+        check("GET /users/{id}", "secondary", lambda: client.get(f"/api/users/{user_id}"))
+        check("PUT /products/{id}", "primary", lambda: client.put(f"/api/products/{product_id}", json={"stock": 24}))
+        check("POST /cart/{sid}/items", "primary", lambda: client.post(
+            "/api/cart/routing-check/items", json={"product_id": product_id, "quantity": 1, "selected_color": "#222222"}
+        ))
+        check("GET /cart/{sid}", "primary", lambda: client.get("/api/cart/routing-check"))
+
+    print("All commands routed as expected" if not failures else f"{failures} endpoint(s) routed wrongly")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/bin/bash
+# Three-member MongoDB replica set on localhost, for trying read routing:
+#
+#   scripts/local-replica-set.sh start
+#   MONGO_URL=mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0 \
+#       python scripts/check_read_routing.py
+#   scripts/local-replica-set.sh stop
+#
+# Needs mongod and mongosh on PATH.
+
+set -e
+
+REPLICA_SET=${REPLICA_SET:-rs0}
+PORTS="27017 27018 27019"
+DATA_DIR=${DATA_DIR:-/tmp/mongo-$REPLICA_SET}
+
+start() {
+    for port in $PORTS; do
+        mkdir -p "$DATA_DIR/$port"
+        mongod --replSet "$REPLICA_SET" --port "$port" --bind_ip localhost \
+            --dbpath "$DATA_DIR/$port" --logpath "$DATA_DIR/$port.log" \
+            --pidfilepath "$DATA_DIR/$port.pid" --fork >/dev/null
+        echo "mongod listening on $port"
+    done
+
+    mongosh --quiet --port 27017 --eval "
+        try { rs.status() } catch (e) {
+            rs.initiate({_id: '$REPLICA_SET', members: [
+                {_id: 0, host: 'localhost:27017', priority: 2},
+                {_id: 1, host: 'localhost:27018', priority: 1},
+                {_id: 2, host: 'localhost:27019', priority: 1},
+            ]})
+        }
+        while (!db.hello().isWritablePrimary) { sleep(200) }
+    "
+    echo "Replica set $REPLICA_SET ready:"
+    echo "MONGO_URL=mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=$REPLICA_SET"
+}
+
+stop() {
+    for port in $PORTS; do
+        if [ -f "$DATA_DIR/$port.pid" ]; then
+            kill "$(cat "$DATA_DIR/$port.pid")" 2>/dev/null || true
+            rm -f "$DATA_DIR/$port.pid"
+        fi
+    done
+    echo "Replica set $REPLICA_SET stopped (data kept in $DATA_DIR)"
+}
+
+case "$1" in
+    start) start ;;
+    stop) stop ;;
+    *) echo "Usage: $0 start|stop"; exit 1 ;;
+esac
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Fill a database with generated products, users and carts.
+
+Streams deterministic documents (see backend/seeding.py) into MONGO_URL
+with parallel unordered insert_many batches; rerunning with the same seed,
+even after a run that crashed partway, skips what is already there. The
+unique indexes that make that work are created first; the secondary ones
+afterwards, since building them once over the loaded data beats
+maintaining them on every insert into a fresh database.
+
+    python scripts/seed.py --products 1000000 --users 200000 --carts 100000 --seed 42
+    python scripts/seed.py --db staging --products 50000 --drop
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from indexes import REQUIRED_INDEXES, ensure_indexes
+from search import search_text
+from seeding import seed
+
+load_dotenv(Path(__file__).resolve().parent.parent / "backend" / ".env")
+
+SEEDED = ("products", "users", "carts", "reservations")
+
+# Duplicate-key errors are how a rerun recognises documents it already wrote
+UNIQUE_INDEXES = {
+    name: [model for model in REQUIRED_INDEXES[name] if model.document.get("unique")]
+    for name in SEEDED
+}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=0)
+    parser.add_argument("--carts", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0, help="same seed, same documents")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8, help="batches in flight")
+    parser.add_argument("--db", default=os.environ.get("DB_NAME"), help="default: DB_NAME")
+    parser.add_argument("--drop", action="store_true", help="drop the seeded collections first")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], maxPoolSize=args.concurrency + 2)
+    db = client[args.db]
+    if args.drop:
+        for name in SEEDED:
+            await db.drop_collection(name)
+    await ensure_indexes(db, UNIQUE_INDEXES)
+
+    start = time.perf_counter()
+    report = await seed(
+        db, products=args.products, users=args.users, carts=args.carts, seed=args.seed,
+        batch_size=args.batch_size, concurrency=args.concurrency,
+        enrich_product=lambda product: {"search_text": search_text(product)},
+    )
+    elapsed = time.perf_counter() - start
+    for name, counts in report.items():
+        print(f"{name:>9}: {counts['inserted']:>9} inserted, {counts['existing']:>9} already present")
+    inserted = sum(counts["inserted"] for counts in report.values())
+    print(f"{inserted} documents in {elapsed:.1f}s ({inserted / elapsed:.0f}/s)")
+
+    start = time.perf_counter()
+    await ensure_indexes(db)
+    print(f"indexes ready in {time.perf_counter() - start:.1f}s")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
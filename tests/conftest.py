@@ -0,0 +1,70 @@
+"""The app in-process on mongomock-motor, so the suite needs no MongoDB."""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "backend"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from bench_api import use_mongomock  # noqa: E402
+
+os.environ["MONGO_URL"] = "mongodb://localhost:27017"
+os.environ["DB_NAME"] = "tests"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ.pop("REDIS_URL", None)
+os.environ.pop("RATE_LIMIT_REDIS_URL", None)
+
+
+@pytest.fixture(scope="session")
+def server():
+    import server
+    use_mongomock(server)
+    return server
+
+
+@pytest.fixture
+def api(server):
+    """A TestClient on an empty database; the lifespan runs as under
+    uvicorn, and each run opens a new in-memory store."""
+    from fastapi.testclient import TestClient
+
+    server.catalog_cache.clear()
+    server.catalog_reads.forget()
+    with TestClient(server.app) as client:
+        yield client
+
+
+COMMANDS = (
+    "aggregate", "bulk_write", "count_documents", "delete_many", "delete_one", "distinct", "find",
+    "find_one", "find_one_and_delete", "find_one_and_replace", "find_one_and_update", "insert_many",
+    "insert_one", "replace_one", "update_many", "update_one",
+)
+
+
+@pytest.fixture
+def commands(monkeypatch):
+    """The (collection, method) of every command sent to mongomock, in
+    order; a helper one method calls internally is not counted again."""
+    import mongomock.collection
+
+    sent = []
+    depth = [0]
+
+    def counting(name, method):
+        def command(self, *args, **kwargs):
+            if not depth[0]:
+                sent.append((self.name, name))
+            depth[0] += 1
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                depth[0] -= 1
+        return command
+
+    for name in COMMANDS:
+        method = getattr(mongomock.collection.Collection, name)
+        monkeypatch.setattr(mongomock.collection.Collection, name, counting(name, method))
+    return sent
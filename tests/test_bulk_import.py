@@ -0,0 +1,121 @@
+import json
+
+
+def ndjson(records) -> bytes:
+    return b"".join(json.dumps(record).encode() + b"\n" for record in records)
+
+
+def product(i: int, **fields) -> dict:
+    return {"name": f"Product {i}", "description": "", "price": 100.0 + i, "category": "Bulk",
+            "product_type": "laptop", "stock": 10, **fields}
+
+
+def bulk(api, body: bytes, content_type: str, **params):
+    return api.post("/api/products/bulk", content=body, headers={"Content-Type": content_type}, params=params)
+
+
+def stored(api, product_id: str) -> dict:
+    return api.get(f"/api/products/{product_id}").json()
+
+
+def test_json_rows_are_inserted_and_upserted(api):
+    body = json.dumps([product(1), product(2, id="bulk-2"), product(3, id="bulk-3", featured=True)]).encode()
+    # mongomock numbers upserts among the updates of a batch rather than
+    # among all its operations, so inserts and upserts go in separate ones
+    response = bulk(api, body, "application/json", batch_size=1)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["inserted"], report["updated"], report["failed"], report["total"]) == (3, 0, 0, 3)
+    assert [result["row"] for result in report["results"]] == [1, 2, 3]
+    assert stored(api, "bulk-3")["featured"] is True
+
+
+def test_invalid_rows_are_reported_and_skipped(api):
+    body = json.dumps([
+        product(1, id="good"),
+        {"name": "No price", "description": "", "category": "Bulk", "product_type": "laptop"},
+        "not an object",
+        product(4, id=""),
+        product(5, price="cheap"),
+    ]).encode()
+    report = bulk(api, body, "application/json").json()
+    assert (report["inserted"], report["failed"]) == (1, 4)
+    errors = {result["row"]: result.get("error") for result in report["results"]}
+    assert errors[1] is None
+    assert "price" in errors[2]
+    assert errors[3] == "row must be an object"
+    assert errors[4] == "id must be a non-empty string"
+    assert "price" in errors[5]
+    assert api.get("/api/products", params={"category": "Bulk"}).json()[0]["id"] == "good"
+
+
+def required(i: int, **fields) -> dict:
+    row = product(i, **fields)
+    del row["stock"]
+    return row
+
+
+def test_an_upsert_only_overwrites_the_fields_it_gives(api):
+    bulk(api, ndjson([product(1, id="partial", colors=["red"], featured=True)]), "application/x-ndjson")
+    report = bulk(api, ndjson([required(1, id="partial", price=5.0)]), "application/x-ndjson").json()
+    assert (report["updated"], report["failed"]) == (1, 0)
+    after = stored(api, "partial")
+    assert after["price"] == 5.0
+    assert (after["colors"], after["featured"], after["stock"]) == (["red"], True, 10)
+
+
+def test_an_upsert_that_creates_a_product_applies_the_defaults(api):
+    report = bulk(api, ndjson([required(1, id="new")]), "application/x-ndjson").json()
+    assert report["inserted"] == 1
+    created = stored(api, "new")
+    assert (created["colors"], created["featured"], created["stock"]) == ([], False, 0)
+
+
+def test_csv_rows_with_quoting(api):
+    body = (
+        "id,name,description,price,category,product_type,colors,stock\r\n"
+        'csv-1,"Laptop, 14 inch","Says ""fast""",100,Bulk,laptop,black;silver,3\r\n'
+        'csv-2,Phone,"Two\nlines",200,Bulk,phone,,4\r\n'
+        "csv-3,Broken,,not a price,Bulk,phone,,1\r\n"
+    ).encode()
+    report = bulk(api, body, "text/csv").json()
+    assert (report["inserted"], report["failed"]) == (2, 1)
+    assert report["results"][2]["row"] == 3 and "price" in report["results"][2]["error"]
+    first = stored(api, "csv-1")
+    assert (first["name"], first["description"], first["colors"]) == ("Laptop, 14 inch", 'Says "fast"', ["black", "silver"])
+    assert stored(api, "csv-2")["description"] == "Two\nlines"
+
+
+def test_unterminated_csv_quote_fails_the_last_row(api):
+    body = b'id,name,description,price,category,product_type\nq-1,Ok,x,1,Bulk,laptop\nq-2,"Open,x,1,Bulk,laptop\n'
+    report = bulk(api, body, "text/csv").json()
+    assert (report["inserted"], report["failed"]) == (1, 1)
+    assert report["results"][1]["error"] == "unterminated quoted field"
+
+
+def test_held_units_are_subtracted_from_imported_stock(api):
+    bulk(api, ndjson([product(1, id="held", stock=5)]), "application/x-ndjson")
+    added = api.post("/api/cart/shopper/items", json={"product_id": "held", "quantity": 2, "selected_color": "black"})
+    assert added.status_code == 200
+
+    bulk(api, ndjson([product(1, id="held", stock=6)]), "application/x-ndjson")
+    assert api.get("/api/products/held/stock").json()["stock"] == 4
+    # Rows that leave stock alone keep it
+    bulk(api, ndjson([required(1, id="held", price=1.0)]), "application/x-ndjson")
+    assert api.get("/api/products/held/stock").json()["stock"] == 4
+
+
+def test_unreadable_input_returns_the_partial_report(api):
+    body = ndjson([product(i, id=f"early-{i}") for i in range(3)]) + b'{"name": "\xff"}\n' + ndjson([product(9)])
+    response = bulk(api, body, "application/x-ndjson", batch_size=2)
+    assert response.status_code == 400
+    report = response.json()
+    assert "utf-8" in report["error"]
+    assert (report["inserted"], report["total"]) == (3, 3)
+    assert all(api.get(f"/api/products/early-{i}").status_code == 200 for i in range(3))
+
+
+def test_malformed_json_array_is_a_400_with_an_empty_report(api):
+    response = bulk(api, b'[{"name": ', "application/json")
+    assert response.status_code == 400
+    assert (response.json()["total"], bool(response.json()["error"])) == (0, True)
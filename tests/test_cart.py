@@ -0,0 +1,19 @@
+def test_an_empty_cart_has_the_same_id_everywhere(api):
+    cart = api.get("/api/cart/new-session").json()
+    view = api.get("/api/cart/new-session/view").json()
+    assert view["id"] == cart["id"]
+    assert (view["items"], view["item_count"], view["subtotal"]) == ([], 0, 0)
+    assert cart["id"] != api.get("/api/cart/other-session").json()["id"]
+
+
+def test_a_cart_keeps_its_id_once_stored(api):
+    before = api.get("/api/cart/shopper").json()["id"]
+    created = api.post("/api/products", json={
+        "name": "Cart Product", "description": "", "price": 10.0, "category": "Test",
+        "product_type": "laptop", "stock": 1,
+    }).json()
+    added = api.post("/api/cart/shopper/items", json={
+        "product_id": created["id"], "quantity": 1, "selected_color": "black",
+    })
+    assert added.json()["cart"]["id"] == before
+    assert api.get("/api/cart/shopper").json()["id"] == before
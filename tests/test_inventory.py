@@ -0,0 +1,40 @@
+def create_product(api, stock: int) -> str:
+    response = api.post("/api/products", json={
+        "name": "Reserved", "description": "", "price": 10.0, "category": "Test",
+        "product_type": "laptop", "stock": stock,
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def add_to_cart(api, session_id: str, product_id: str, quantity: int):
+    return api.post(f"/api/cart/{session_id}/items", json={
+        "product_id": product_id, "quantity": quantity, "selected_color": "black",
+    })
+
+
+def test_stock_update_leaves_held_units_reserved(api):
+    product_id = create_product(api, stock=5)
+    assert add_to_cart(api, "holder", product_id, 3).status_code == 200
+
+    # 5 units on hand, 3 of them in the holder's cart
+    response = api.put(f"/api/products/{product_id}", json={"stock": 5})
+    assert response.status_code == 200
+    assert response.json()["stock"] == 2
+    assert api.get(f"/api/products/{product_id}/stock").json()["stock"] == 2
+
+    assert add_to_cart(api, "other", product_id, 3).status_code == 409
+    assert add_to_cart(api, "other", product_id, 2).status_code == 200
+
+
+def test_stock_update_never_goes_negative(api):
+    product_id = create_product(api, stock=4)
+    assert add_to_cart(api, "holder", product_id, 4).status_code == 200
+
+    response = api.put(f"/api/products/{product_id}", json={"stock": 1})
+    assert response.json()["stock"] == 0
+
+
+def test_stock_update_without_reservations_is_taken_as_is(api):
+    product_id = create_product(api, stock=4)
+    assert api.put(f"/api/products/{product_id}", json={"stock": 9}).json()["stock"] == 9
@@ -0,0 +1,140 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from pagination import InvalidCursor, SortKey, decode_cursor, encode_cursor, keyset_filter
+
+SORT = (SortKey("timestamp", datetime), SortKey("id", str))
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trips():
+    document = {"timestamp": datetime(2024, 5, 1, 12, 30, 15, 250000), "id": "abc"}
+    assert decode_cursor(encode_cursor(document, SORT), SORT) == [document["timestamp"], "abc"]
+
+
+def test_keyset_filter_compares_plain_values():
+    cursor = encode_cursor({"timestamp": datetime(2024, 5, 1), "id": "abc"}, SORT)
+    assert keyset_filter({"x": 1}, SORT, cursor) == {"$and": [{"x": 1}, {"$or": [
+        {"timestamp": {"$gt": datetime(2024, 5, 1)}},
+        {"timestamp": datetime(2024, 5, 1), "id": {"$gt": "abc"}},
+    ]}]}
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+    raw_cursor({"timestamp": "2024-05-01", "id": "abc"}),
+    raw_cursor(["2024-05-01"]),
+    raw_cursor(["2024-05-01", {"$ne": None}]),
+    raw_cursor(["2024-05-01", {"$regex": ".*"}]),
+    raw_cursor([{"$date": []}, "abc"]),
+    raw_cursor([{"$oid": "nope"}, "abc"]),
+    raw_cursor(["yesterday", "abc"]),
+    raw_cursor([1714566615, "abc"]),
+    raw_cursor(["2024-05-01", 7]),
+    raw_cursor("[" * 100000),
+])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, SORT)
+
+
+def test_number_keys_accept_only_finite_numbers():
+    price = (SortKey("price", float),)
+    assert decode_cursor(raw_cursor([12.5]), price) == [12.5]
+    assert decode_cursor(raw_cursor([12]), price) == [12]
+    for value in (True, "12", None):
+        with pytest.raises(InvalidCursor):
+            decode_cursor(raw_cursor([value]), price)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(base64.urlsafe_b64encode(b"[NaN]").decode(), price)
+
+
+def test_products_page_through_every_match(api):
+    for i in range(7):
+        response = api.post("/api/products", json={
+            "name": f"Product {i}", "description": "", "price": 10.0, "category": "Paged",
+            "product_type": "laptop", "stock": 1,
+        })
+        assert response.status_code == 200, response.text
+
+    seen, cursor = [], None
+    while True:
+        params = {"category": "Paged", "limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = api.get("/api/products", params=params)
+        assert response.status_code == 200
+        seen += [product["id"] for product in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert len(seen) == 7
+    assert seen == sorted(set(seen))
+
+
+def test_status_checks_page_by_timestamp(api):
+    for i in range(5):
+        assert api.post("/api/status", json={"client_name": f"client-{i}"}).status_code == 200
+    first = api.get("/api/status", params={"limit": 2})
+    second = api.get("/api/status", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+    rest = api.get("/api/status", params={"limit": 2, "cursor": second.headers["X-Next-Cursor"]})
+    names = [check["client_name"] for page in (first, second, rest) for check in page.json()]
+    # Checks made in the same millisecond are ordered by id
+    assert names == [check["client_name"] for check in api.get("/api/status").json()]
+    assert sorted(names) == [f"client-{i}" for i in range(5)]
+    assert "X-Next-Cursor" not in rest.headers
+
+
+@pytest.mark.parametrize("cursor", [
+    raw_cursor([{"$oid": "zz"}]),
+    raw_cursor([{"$regularExpression": {"pattern": ".*", "options": ""}}]),
+    raw_cursor([{"$gt": ""}]),
+    "%%%",
+])
+def test_api_answers_bad_cursors_with_400(api, cursor):
+    assert api.get("/api/products", params={"cursor": cursor}).status_code == 400
+    assert api.get("/api/status", params={"cursor": cursor}).status_code == 400
+
+
+def read_stream(api, path, cursor=None):
+    params = {"cursor": cursor} if cursor else {}
+    response = api.get(path, params=params, headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()], response.headers.get("X-Next-Cursor")
+
+
+def test_streams_stop_at_the_cap_and_resume_from_their_cursor(api, server, monkeypatch):
+    monkeypatch.setattr(server, "MAX_STREAM_SIZE", 3)
+    for i in range(7):
+        assert api.post("/api/status", json={"client_name": f"client-{i}"}).status_code == 200
+
+    seen, cursor, streams = [], None, 0
+    while True:
+        checks, cursor = read_stream(api, "/api/status", cursor)
+        assert len(checks) <= 3
+        seen += [check["client_name"] for check in checks]
+        streams += 1
+        if not cursor:
+            break
+    assert seen == [check["client_name"] for check in api.get("/api/status").json()]
+    assert sorted(seen) == [f"client-{i}" for i in range(7)]
+    assert streams == 3
+
+
+def test_product_streams_are_capped(api, server, monkeypatch):
+    monkeypatch.setattr(server, "MAX_STREAM_SIZE", 2)
+    for i in range(3):
+        api.post("/api/products", json={
+            "name": f"Product {i}", "description": "", "price": 10.0, "category": "Streamed",
+            "product_type": "laptop", "stock": 1,
+        })
+    first, cursor = read_stream(api, "/api/products")
+    rest, last = read_stream(api, "/api/products", cursor)
+    assert len(first) == 2 and len(rest) == 1 and last is None
+    assert sorted(product["id"] for product in first + rest) == [product["id"] for product in first + rest]
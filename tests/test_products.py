@@ -0,0 +1,59 @@
+import uuid
+
+
+def create_product(api, **fields) -> str:
+    response = api.post("/api/products", json={
+        "name": "Round Trip Product", "description": "Sản phẩm kiểm tra số lượt truy vấn",
+        "price": 1999000, "category": "Test", "product_type": "test_device", "stock": 5, **fields,
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def product_commands(commands, request):
+    del commands[:]
+    response = request()
+    return response, [method for collection, method in commands if collection == "products"]
+
+
+def test_update_is_one_find_and_modify(api, commands):
+    product_id = create_product(api)
+
+    response, sent = product_commands(commands, lambda: api.put(f"/api/products/{product_id}", json={"price": 2499000}))
+    assert response.status_code == 200
+    assert response.json()["price"] == 2499000
+    assert sent == ["find_one_and_update"]
+
+    both = {"name": "Renamed", "description": "Mô tả mới"}
+    response, sent = product_commands(commands, lambda: api.put(f"/api/products/{product_id}", json=both))
+    assert sent == ["find_one_and_update"]
+
+
+def test_rename_alone_also_refreshes_search_text(api, commands):
+    product_id = create_product(api)
+    response, sent = product_commands(commands, lambda: api.put(f"/api/products/{product_id}", json={"name": "Renamed"}))
+    assert response.json()["name"] == "Renamed"
+    assert sent == ["find_one_and_update", "update_one"]
+
+
+def test_update_of_a_missing_product_is_one_command(api, commands):
+    response, sent = product_commands(commands, lambda: api.put(f"/api/products/{uuid.uuid4()}", json={"price": 1}))
+    assert response.status_code == 404
+    assert sent == ["find_one_and_update"]
+
+
+def test_redis_hits_keep_last_modified(api, server, monkeypatch):
+    from redis_cache import create_redis_cache
+
+    monkeypatch.setattr(server, "redis_cache", create_redis_cache("memory://"))
+    product_id = create_product(api)
+
+    miss = api.get(f"/api/products/{product_id}")
+    hit = api.get(f"/api/products/{product_id}")
+    assert server.redis_cache.hits == 1
+    assert hit.content == miss.content
+    assert hit.headers["Last-Modified"] == miss.headers["Last-Modified"]
+    revalidated = api.get(f"/api/products/{product_id}", headers={"If-Modified-Since": hit.headers["Last-Modified"]})
+    assert revalidated.status_code == 304
+
+    assert api.get("/api/products/missing").status_code == 404
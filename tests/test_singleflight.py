@@ -0,0 +1,131 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_runs_share_one_load():
+    flight = SingleFlight()
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return {"loaded": len(loads)}
+
+    async def scenario():
+        return await asyncio.gather(*(flight.run("key", loader) for _ in range(50)))
+
+    results = asyncio.run(scenario())
+    assert len(loads) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {"hits": 49, "misses": 1, "coalesced": 49, "hit_ratio": 49 / 50}
+
+
+def test_later_runs_start_a_new_load():
+    flight = SingleFlight()
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return len(loads)
+
+    async def scenario():
+        return [await flight.run("key", loader), await flight.run("key", loader)]
+
+    assert asyncio.run(scenario()) == [1, 2]
+
+
+def test_forget_starts_a_new_load_for_later_callers():
+    flight = SingleFlight()
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        load = len(loads)
+        await asyncio.sleep(0.01)
+        return load
+
+    async def scenario():
+        first = asyncio.ensure_future(flight.run("key", loader))
+        await asyncio.sleep(0)
+        flight.forget()
+        return await asyncio.gather(first, flight.run("key", loader))
+
+    assert asyncio.run(scenario()) == [1, 2]
+
+
+def test_every_caller_sees_the_error():
+    flight = SingleFlight()
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise LookupError("gone")
+
+    async def scenario():
+        return await asyncio.gather(*(flight.run("key", loader) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(scenario())
+    assert [type(error) for error in errors] == [LookupError] * 3
+
+
+def test_a_cancelled_caller_does_not_cancel_the_load():
+    flight = SingleFlight()
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def scenario():
+        leaving = asyncio.ensure_future(flight.run("key", loader))
+        staying = asyncio.ensure_future(flight.run("key", loader))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        return await staying
+
+    assert asyncio.run(scenario()) == "done"
+
+
+@pytest.fixture
+def slow_catalog(server, monkeypatch):
+    """Reads that take long enough for concurrent requests to overlap."""
+    get_or_load = server.catalog_cache.get_or_load
+
+    async def slowly(key, loader):
+        await asyncio.sleep(0.05)
+        return await get_or_load(key, loader)
+
+    monkeypatch.setattr(server.catalog_cache, "get_or_load", slowly)
+
+
+def concurrent_gets(api, url: str, requests: int = 20):
+    with ThreadPoolExecutor(max_workers=requests) as executor:
+        return list(executor.map(lambda _: api.get(url), range(requests)))
+
+
+@pytest.mark.parametrize("path", ["/api/products/{id}", "/api/products?category=Launch"])
+def test_concurrent_catalog_reads_are_coalesced(api, server, commands, slow_catalog, path):
+    response = api.post("/api/products", json={
+        "name": "Launch Product", "description": "", "price": 10.0, "category": "Launch",
+        "product_type": "laptop", "stock": 10,
+    })
+    product_id = response.json()["id"]
+    flights = server.catalog_reads.stats()
+    del commands[:]
+
+    responses = concurrent_gets(api, path.format(id=product_id))
+
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.content for response in responses}) == 1
+    reads = [method for collection, method in commands if collection == "products"]
+    assert len(reads) == 1
+    assert server.catalog_reads.stats()["misses"] - flights["misses"] == 1
+
+
+def test_cache_stats_report_coalesced_reads(api, server, slow_catalog):
+    concurrent_gets(api, "/api/products?category=Stats", requests=5)
+    stats = api.get("/api/cache/stats").json()
+    assert stats["singleflight"] == server.catalog_reads.stats()
+    assert stats["singleflight"]["coalesced"] >= 4
@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+import trending
+from indexes import REQUIRED_INDEXES
+
+
+async def database():
+    db = AsyncMongoMockClient()["trending"]
+    await db.leases.create_indexes(REQUIRED_INDEXES["leases"])
+    return db
+
+
+def test_one_holder_at_a_time():
+    async def scenario():
+        db = await database()
+        now = datetime(2024, 5, 1)
+        ttl = timedelta(minutes=10)
+        return [
+            await trending.hold_lease(db.leases, "trending", "a", ttl, now),
+            await trending.hold_lease(db.leases, "trending", "b", ttl, now),
+            # The holder renews
+            await trending.hold_lease(db.leases, "trending", "a", ttl, now + timedelta(minutes=5)),
+            await trending.hold_lease(db.leases, "trending", "b", ttl, now + timedelta(minutes=12)),
+            # and takes over once a's renewal lapses
+            await trending.hold_lease(db.leases, "trending", "b", ttl, now + timedelta(minutes=16)),
+            await trending.hold_lease(db.leases, "trending", "a", ttl, now + timedelta(minutes=17)),
+        ]
+
+    assert asyncio.run(scenario()) == [True, False, True, False, True, False]
+
+
+def test_only_the_lease_holder_refreshes(monkeypatch):
+    refreshes = []
+
+    async def refresh(db, **kwargs):
+        refreshes.append(1)
+
+    monkeypatch.setattr(trending, "refresh", refresh)
+
+    async def scenario():
+        db = await database()
+        workers = [asyncio.ensure_future(trending.refresh_periodically(db, 0.01)) for _ in range(4)]
+        await asyncio.sleep(0.1)
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        return await db.leases.count_documents({})
+
+    assert asyncio.run(scenario()) == 1
+    # One worker refreshing every interval, not four
+    assert 0 < len(refreshes) <= 12
+
+
+def test_lists_are_padded_with_featured_products_first():
+    async def scenario():
+        db = await database()
+        await db.products.insert_many([
+            {"id": f"p{i}", "category": "Laptop", "featured": i in (1, 3)} for i in range(5)
+        ])
+        await db.product_events.insert_one({"product_id": "p4", "hour": datetime.utcnow(), "views": 3})
+        await trending.refresh(db, {"_id": 0, "id": 1, "category": 1}, timedelta(hours=1), size=4)
+        return await db.merchandising.find_one({"id": trending.category_list("Laptop")})
+
+    products = [product["id"] for product in asyncio.run(scenario())["products"]]
+    assert products[0] == "p4"
+    assert set(products[1:3]) == {"p1", "p3"}
+    assert len(products) == 4